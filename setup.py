@@ -12,6 +12,10 @@ setup(
     packages=find_packages(),
     python_requires=">=3.9",
     install_requires=requirements,
+    extras_require={
+        # Exact token counts for --chunk_tokens and --prompt_budget.
+        "tokens": ["tiktoken"],
+    },
     entry_points={
         "console_scripts": [
             "znato=znato.cli:main",
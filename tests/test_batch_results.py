@@ -0,0 +1,58 @@
+import json
+
+from znato.generate_ontology import read_batch_results
+
+
+def result_line(custom_id, content=None, status_code=200, **fields):
+    if content is None:
+        content = {"concepts": [{"id": custom_id}], "relationships": []}
+    body = {"choices": [{"message": {"content": json.dumps(content)}}]}
+    return {"custom_id": custom_id, "response": {"status_code": status_code, "body": body}, **fields}
+
+
+def write_jsonl(path, lines):
+    path.write_text("".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def test_valid_failed_and_missing_lines(tmp_path):
+    requests = write_jsonl(tmp_path / "requests.jsonl", [{"custom_id": f"chunk-{i}"} for i in range(5)])
+    results = write_jsonl(tmp_path / "results.jsonl", [
+        result_line("chunk-1"),
+        result_line("chunk-0"),
+        result_line("chunk-2", status_code=500),
+        result_line("chunk-3", content={"concepts": "nope"}),
+    ])
+
+    graphs, failed, missing = read_batch_results([results], requests)
+
+    assert [g.concepts[0].id for g in graphs] == ["chunk-0", "chunk-1"]
+    assert set(failed) == {"chunk-2", "chunk-3"}
+    assert missing == ["chunk-4"]
+
+
+def test_lines_that_are_not_objects_count_as_failed(tmp_path):
+    requests = write_jsonl(tmp_path / "requests.jsonl", [{"custom_id": "chunk-0"}, {"custom_id": "chunk-1"}])
+    results = write_jsonl(tmp_path / "results.jsonl", [
+        "[]",
+        '"x"',
+        "{not json",
+        {"custom_id": "chunk-1", "response": "x"},
+        result_line("chunk-0"),
+    ])
+
+    graphs, failed, missing = read_batch_results([results], requests)
+
+    assert len(graphs) == 1
+    assert set(failed) == {f"{results}:1", f"{results}:2", f"{results}:3", "chunk-1"}
+    assert missing == []
+
+
+def test_retry_results_replace_failures(tmp_path):
+    first = write_jsonl(tmp_path / "results.jsonl", [result_line("chunk-0"), result_line("chunk-1", status_code=429)])
+    retry = write_jsonl(tmp_path / "retry_results.jsonl", [result_line("chunk-1")])
+
+    graphs, failed, missing = read_batch_results([first, retry])
+
+    assert len(graphs) == 2
+    assert failed == {}
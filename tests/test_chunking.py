@@ -0,0 +1,34 @@
+import pytest
+
+from znato import chunking
+from znato.chunking import count_tokens, iter_token_chunks, split_oversized
+
+
+@pytest.fixture
+def estimated(monkeypatch):
+    """Count tokens with the character-based estimate, as without tiktoken."""
+    monkeypatch.setattr(chunking, "tiktoken", None)
+    monkeypatch.setattr(chunking, "_encodings", {})
+
+
+@pytest.mark.parametrize("max_tokens", [1, 2, 7, 100])
+def test_split_oversized_hard_cut_stays_within_budget(estimated, max_tokens):
+    text = "x" * 1000
+    pieces = split_oversized(text, max_tokens)
+    assert "".join(pieces) == text
+    assert all(count_tokens(piece) <= max_tokens for piece in pieces)
+
+
+def test_split_oversized_prefers_lines_then_sentences(estimated):
+    lines = ["First sentence here. Second one follows." * 3 for _ in range(4)]
+    pieces = split_oversized("\n".join(lines), 40)
+    assert all(count_tokens(piece) <= 40 for piece in pieces)
+    assert all(not piece.startswith(" ") for piece in pieces)
+
+
+def test_iter_token_chunks_respects_budget_with_oversized_unit(estimated):
+    units = [("short paragraph", "document"), ("y" * 2000, None), ("tail", None)]
+    chunks = list(iter_token_chunks(units, 50))
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert chunks[0].startswith("short paragraph")
+    assert chunks[-1].endswith("tail")
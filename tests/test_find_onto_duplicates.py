@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from znato import find_onto_duplicates as fd
+from znato.synthetic import synthetic_ontology
+
+
+def random_labels(n, seed=0):
+    """Labels of a few words, about a third of them small edits of an earlier label."""
+    rng = random.Random(seed)
+    words = ["order", "payment", "customer", "invoice", "item", "service", "account", "user", "report", "event"]
+    labels = []
+    for _ in range(n):
+        if labels and rng.random() < 0.35:
+            label = list(rng.choice(labels))
+            for _ in range(rng.randint(1, 3)):
+                k = rng.randrange(len(label))
+                label[k] = rng.choice("abcdefghijklmnopqrstuvwxyz ")
+            labels.append("".join(label))
+        else:
+            labels.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))))
+    return labels
+
+
+def brute_force(labels, threshold, groups=None):
+    return {
+        (i, j)
+        for i, j in fd.all_pairs(len(labels))
+        if (groups is None or groups[i] != groups[j]) and fd.similar(labels[i], labels[j]) >= threshold
+    }
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.95])
+def test_blocking_finds_the_same_pairs_as_brute_force(threshold):
+    labels = random_labels(150)
+    found = {(i, j) for i, j, _ in fd.score_label_pairs(labels, threshold, block_size=64)}
+    assert found == brute_force(labels, threshold)
+
+
+def test_blocking_scores_match_similar():
+    labels = random_labels(100, seed=1)
+    for i, j, score in fd.score_label_pairs(labels, 0.7):
+        assert score == pytest.approx(fd.similar(labels[i], labels[j]))
+
+
+def test_blocking_across_groups_skips_pairs_within_a_group():
+    labels = random_labels(200, seed=2)
+    groups = [k % 3 for k in range(len(labels))]
+    found = {(i, j) for i, j, _ in fd.score_label_pairs(labels, 0.8, block_size=50, groups=groups)}
+    assert found == brute_force(labels, 0.8, groups)
+
+
+def test_find_equivalent_classes_matches_brute_force(tmp_path, monkeypatch):
+    monkeypatch.setenv("ZNATO_CACHE_DIR", str(tmp_path / "cache"))
+    for k in range(3):
+        synthetic_ontology(tmp_path / f"o{k}.ttl", 60, duplicate_rate=0.2, seed=k)
+
+    blocked = fd.find_equivalent_classes(str(tmp_path), 0.85)
+    assert blocked == fd.find_equivalent_classes(str(tmp_path), 0.85, brute_force=True)
+    assert blocked
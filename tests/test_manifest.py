@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from znato.generate_ontology import (
+    MANIFEST_VERSION,
+    Concept,
+    MetaGraph,
+    load_manifest,
+    save_manifest,
+    update_manifest,
+)
+
+SETTINGS = {"chunk_size": 200, "overlap_size": 0, "dedup_threshold": 0}
+
+
+class FakeExtractor:
+    """Stands in for the LLM: one concept per chunk, named after the chunk's first word."""
+
+    def __init__(self, fail_on=None):
+        self.chunks = []
+        self.fail_on = fail_on
+
+    def __call__(self, chunks, failures):
+        self.chunks.extend(chunks)
+        graphs = []
+        for k, chunk in enumerate(chunks):
+            if self.fail_on and self.fail_on in chunk:
+                failures.append(f"chunk {k}")
+                continue
+            graphs.append(MetaGraph(concepts=[Concept(id=chunk.split()[0])], relationships=[]))
+        return graphs
+
+
+@pytest.fixture
+def docs(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for name in ("alpha", "beta", "gamma"):
+        (folder / f"{name}.txt").write_text(f"{name} text of the document", encoding="utf-8")
+    return folder
+
+
+def run(folder, manifest, extract):
+    return update_manifest(str(folder), manifest, SETTINGS["chunk_size"], SETTINGS["overlap_size"], extract)
+
+
+def concept_ids(manifest):
+    return sorted(c["id"] for entry in manifest["files"].values() for c in entry["graph"]["concepts"])
+
+
+def test_only_added_and_changed_files_are_extracted(docs, tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = load_manifest(path, SETTINGS)
+    assert run(docs, manifest, FakeExtractor()) == {"reused": 0, "extracted": 3, "removed": 0}
+    save_manifest(manifest, path)
+
+    (docs / "beta.txt").write_text("delta replaces beta", encoding="utf-8")
+    (docs / "gamma.txt").unlink()
+    (docs / "epsilon.txt").write_text("epsilon is new", encoding="utf-8")
+    extract = FakeExtractor()
+    manifest = load_manifest(path, SETTINGS)
+    assert run(docs, manifest, extract) == {"reused": 1, "extracted": 2, "removed": 1}
+    assert sorted(c.split()[0] for c in extract.chunks) == ["delta", "epsilon"]
+    assert concept_ids(manifest) == ["alpha", "delta", "epsilon"]
+
+
+def test_touched_file_with_same_content_is_reused(docs, tmp_path):
+    manifest = load_manifest(str(tmp_path / "manifest.json"), SETTINGS)
+    run(docs, manifest, FakeExtractor())
+    stat = (docs / "alpha.txt").stat()
+    os.utime(docs / "alpha.txt", (stat.st_atime, stat.st_mtime + 10))
+
+    extract = FakeExtractor()
+    assert run(docs, manifest, extract)["reused"] == 3
+    assert extract.chunks == []
+    assert manifest["files"]["alpha.txt"]["mtime"] == stat.st_mtime + 10
+
+
+def test_files_with_failed_chunks_are_retried(docs, tmp_path):
+    manifest = load_manifest(str(tmp_path / "manifest.json"), SETTINGS)
+    assert run(docs, manifest, FakeExtractor(fail_on="beta"))["extracted"] == 2
+    assert "beta.txt" not in manifest["files"]
+
+    extract = FakeExtractor()
+    assert run(docs, manifest, extract) == {"reused": 2, "extracted": 1, "removed": 0}
+    assert [c.split()[0] for c in extract.chunks] == ["beta"]
+
+
+def test_manifest_entries_do_not_store_texts(docs, tmp_path):
+    manifest = load_manifest(str(tmp_path / "manifest.json"), SETTINGS)
+    run(docs, manifest, FakeExtractor())
+    assert all(set(entry) == {"sha256", "mtime", "size", "graph"} for entry in manifest["files"].values())
+
+
+@pytest.mark.parametrize("change", [{"chunk_size": 100}, {"dedup_threshold": 0.9}, {"extraction": "other prompt"}])
+def test_other_settings_invalidate_the_manifest(docs, tmp_path, change):
+    path = str(tmp_path / "manifest.json")
+    manifest = load_manifest(path, SETTINGS)
+    run(docs, manifest, FakeExtractor())
+    save_manifest(manifest, path)
+
+    assert load_manifest(path, SETTINGS)["files"]
+    assert load_manifest(path, {**SETTINGS, **change})["files"] == {}
+
+
+def test_other_manifest_version_is_ignored(docs, tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = load_manifest(path, SETTINGS)
+    run(docs, manifest, FakeExtractor())
+    save_manifest({**manifest, "version": MANIFEST_VERSION + 1}, path)
+    assert load_manifest(path, SETTINGS)["files"] == {}
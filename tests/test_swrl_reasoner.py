@@ -0,0 +1,70 @@
+import pytest
+from rdflib import Graph
+
+from znato.ontology_index import OntologyIndex
+from znato.swrl_reasoner import Fact, SWRLReasoner
+from znato.swrl_rules import parse_rules
+
+ONTOLOGY = """
+@prefix : <http://example.org/ontology#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+:Customer a owl:Class . :VipCustomer a owl:Class ; rdfs:subClassOf :Customer .
+:RewardEligible a owl:Class . :Reward a owl:Class .
+:hasPoints a owl:DatatypeProperty . :canRedeem a owl:ObjectProperty .
+:alice a :VipCustomer ; :hasPoints 150 .
+:bob a :Customer ; :hasPoints 20 .
+:voucher a :Reward .
+"""
+
+RULES = """
+1. Customer(?x) ∧ hasPoints(?x, ?p) ∧ swrlb:greaterThan(?p, 100) → RewardEligible(?x)
+2. RewardEligible(?x) ∧ Reward(?r) → canRedeem(?x, ?r)
+"""
+
+
+def reasoner(ontology=ONTOLOGY, rules=RULES):
+    graph = Graph().parse(data=ontology, format="turtle")
+    return SWRLReasoner(graph, OntologyIndex.from_graph(graph), parse_rules(rules))
+
+
+@pytest.fixture(scope="module")
+def rewards():
+    return reasoner()
+
+
+def test_fixpoint_chains_subclass_axioms_and_rules(rewards):
+    assert {str(f) for f in rewards.engine.inferred()} == {
+        "Customer(alice)",
+        "RewardEligible(alice)",
+        "canRedeem(alice, voucher)",
+    }
+    assert rewards.inferred_count == 3
+
+
+def test_fixpoint_of_transitive_rule_matches_closure():
+    n = 12
+    ontology = "@prefix : <http://example.org/ontology#> .\n" + "".join(
+        f":n{i} :partOf :n{i + 1} .\n" for i in range(n - 1)
+    )
+    chain = reasoner(ontology, "1. partOf(?x, ?y) ∧ partOf(?y, ?z) → partOf(?x, ?z)")
+    expected = {(f"n{i}", f"n{j}") for i in range(n) for j in range(i + 1, n)}
+    assert chain.engine.facts["partOf"] == expected
+    assert chain.inferred_count == len(expected) - (n - 1)
+
+
+def test_explain_lists_premises_before_conclusion(rewards):
+    chain = rewards.engine.explain(Fact("canRedeem", ("alice", "voucher")))
+    facts = [str(fact) for fact, _ in chain]
+    assert facts[-1] == "canRedeem(alice, voucher)"
+    assert facts.index("Customer(alice)") < facts.index("RewardEligible(alice)")
+
+
+@pytest.mark.parametrize("question", ["Is alice RewardEligible?", "RewardEligible(alice)?", "Does alice canRedeem voucher?"])
+def test_derived_facts_are_answered_yes(rewards, question):
+    assert rewards.answer(question).startswith("Yes.")
+
+
+@pytest.mark.parametrize("question", ["Is bob RewardEligible?", "Is carol a Customer?", "How do rewards work?"])
+def test_other_questions_are_left_to_the_model(rewards, question):
+    assert rewards.answer(question) is None
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from znato.swrl_rules import Atom, Rule, canonical_rule, normalize_rules, parse_rule
+
+RULES = [
+    "Customer(?x) ∧ hasPoints(?x, ?p) ∧ swrlb:greaterThan(?p, 100) → RewardEligible(?x)",
+    "partOf(?a, ?b) ∧ partOf(?b, ?c) → partOf(?a, ?c)",
+    "knows(?a, ?b) ∧ knows(?b, ?c) ∧ knows(?c, ?a) → Triangle(?a) ∧ Triangle(?b)",
+    "Order(?o) ∧ hasItem(?o, ?i) ∧ hasItem(?o, ?j) ∧ swrlb:notEqual(?i, ?j) → MultiItemOrder(?o)",
+]
+
+
+def variant(rule: Rule, rng: random.Random) -> Rule:
+    """The same rule with renamed variables and shuffled atoms."""
+    variables = sorted({a for atom in rule.body + rule.head for a in atom.args if a.startswith("?")})
+    names = dict(zip(variables, rng.sample([f"?v{k}" for k in range(20)], len(variables))))
+
+    def rename(atoms):
+        atoms = [Atom(atom.predicate, tuple(names.get(a, a) for a in atom.args)) for atom in atoms]
+        rng.shuffle(atoms)
+        return tuple(atoms)
+
+    return Rule(rule.number, rule.text, rename(rule.body), rename(rule.head))
+
+
+@pytest.mark.parametrize("text", RULES)
+def test_renamed_and_reordered_rules_are_equivalent(text):
+    rule = parse_rule(text)
+    rng = random.Random(text)
+    expected = canonical_rule(rule)
+    for _ in range(50):
+        assert canonical_rule(variant(rule, rng)) == expected
+
+
+def test_canonical_form_is_a_fixed_point():
+    for text in RULES:
+        canonical = canonical_rule(parse_rule(text))
+        assert canonical_rule(parse_rule(canonical)) == canonical
+
+
+def test_variables_are_renamed_in_order_of_use():
+    assert canonical_rule(parse_rule("B(?q) ∧ A(?q, ?z) → C(?z)")) == "A(?x, ?y) ∧ B(?x) → C(?y)"
+
+
+def test_different_rules_stay_different():
+    joined = canonical_rule(parse_rule("A(?x) ∧ B(?x) → C(?x)"))
+    unjoined = canonical_rule(parse_rule("A(?x) ∧ B(?y) → C(?x)"))
+    assert joined != unjoined
+
+
+def test_repeated_atoms_are_dropped():
+    assert canonical_rule(parse_rule("A(?x) ∧ A(?x) → B(?x)")) == canonical_rule(parse_rule("A(?y) → B(?y)"))
+
+
+def test_normalize_rules_removes_duplicates_and_numbers():
+    lines = [
+        "1. Customer(?x) ∧ VIP(?x) → Gold(?x)",
+        "2. VIP(?c) ∧ Customer(?c) → Gold(?c)",
+        "Not a rule",
+        "",
+        "3. Gold(?x) → Customer(?x)",
+        "Not a rule",
+    ]
+    assert normalize_rules(lines) == [
+        "Customer(?x) ∧ VIP(?x) → Gold(?x)",
+        "Not a rule",
+        "Gold(?x) → Customer(?x)",
+    ]
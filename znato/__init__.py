@@ -1,4 +1,18 @@
-from .client import main as client_main
-from .generate_ontology import main as generate_ontology_main
-from .find_onto_duplicates import main as find_onto_duplicates_main
-from .generate_swrl import main as generate_swrl_main
\ No newline at end of file
+import importlib
+
+# Entry points are resolved on first access, so importing the package does
+# not import every command and its dependencies.
+_EXPORTS = {
+    "client_main": "client",
+    "generate_ontology_main": "generate_ontology",
+    "find_onto_duplicates_main": "find_onto_duplicates",
+    "generate_swrl_main": "generate_swrl",
+    "benchmark_main": "benchmark",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return importlib.import_module(f".{_EXPORTS[name]}", __name__).main
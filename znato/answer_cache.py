@@ -0,0 +1,179 @@
+import re
+import math
+import time
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+
+from .prompt_retrieval import tokenize
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+def cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[token] for token, count in a.items())
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+class AnswerCache:
+    """Persistent SQLite cache of client answers.
+
+    Entries belong to a fingerprint covering the contents of the ontology
+    and rule files, the model and its request parameters, so answers
+    computed from other inputs are never returned. Each entry also records
+    its source (the file paths) and the content fingerprint of those files,
+    so answers for files that have since changed can be deleted without
+    touching those cached under other settings. Entries older than
+    max_age seconds are ignored and deleted, and the least-recently-used
+    ones are evicted once the stored answers exceed max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, max_age: float = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._similar = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "fingerprint TEXT NOT NULL, question TEXT NOT NULL, source TEXT NOT NULL, answer TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL, content TEXT NOT NULL DEFAULT '', "
+            "PRIMARY KEY (fingerprint, question))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "content" not in columns:
+            self._conn.execute("ALTER TABLE answers ADD COLUMN content TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_source ON answers (source)")
+        self._conn.commit()
+
+    def invalidate(self, source: str, content: str) -> int:
+        """Delete answers for `source` computed from other file contents than `content`."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM answers WHERE source = ? AND content != ?", (source, content)
+            ).rowcount
+            self._conn.commit()
+            if deleted:
+                self._similar.clear()
+        return deleted
+
+    def _expired(self, created: float) -> bool:
+        return self.max_age is not None and time.time() - created > self.max_age
+
+    def get(self, fingerprint: str, question: str):
+        """Return the cached answer to a question, or None."""
+        question = normalize_question(question)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created FROM answers WHERE fingerprint = ? AND question = ?",
+                (fingerprint, question),
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1]):
+                self._delete(fingerprint, question)
+                return None
+            self._touch(fingerprint, question)
+        return row[0]
+
+    def get_similar(self, fingerprint: str, question: str, threshold: float):
+        """Return (cached question, answer) for the most similar cached question, or None.
+
+        Questions are compared by cosine similarity of their word counts; only
+        questions sharing at least one word are scored.
+        """
+        tokens = Counter(tokenize(normalize_question(question)))
+        with self._lock:
+            index = self._similarity_index(fingerprint)
+            candidates = set()
+            for token in tokens:
+                candidates.update(index["postings"].get(token, ()))
+            scored = [(cosine(tokens, index["tokens"][other]), other) for other in candidates]
+            # Best match first; a question whose row has expired or gone is
+            # dropped and the next best one tried.
+            for score, other in sorted((m for m in scored if m[0] >= threshold), reverse=True):
+                row = self._conn.execute(
+                    "SELECT answer, created FROM answers WHERE fingerprint = ? AND question = ?",
+                    (fingerprint, other),
+                ).fetchone()
+                if row is None or self._expired(row[1]):
+                    self._delete(fingerprint, other)
+                    continue
+                self._touch(fingerprint, other)
+                return other, row[0]
+        return None
+
+    def put(self, fingerprint: str, question: str, answer: str, source: str = "", content: str = ""):
+        question = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers "
+                "(fingerprint, question, source, answer, size, created, last_used, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, question, source, answer, len(answer) + len(question), now, now, content),
+            )
+            if fingerprint in self._similar:
+                self._add_to_index(self._similar[fingerprint], question)
+            self._evict()
+            self._conn.commit()
+
+    def _similarity_index(self, fingerprint):
+        index = self._similar.get(fingerprint)
+        if index is None:
+            index = self._similar[fingerprint] = {"tokens": {}, "postings": defaultdict(set)}
+            for (question,) in self._conn.execute(
+                "SELECT question FROM answers WHERE fingerprint = ?", (fingerprint,)
+            ):
+                self._add_to_index(index, question)
+        return index
+
+    @staticmethod
+    def _add_to_index(index, question):
+        tokens = Counter(tokenize(question))
+        index["tokens"][question] = tokens
+        for token in tokens:
+            index["postings"][token].add(question)
+
+    def _touch(self, fingerprint, question):
+        self._conn.execute(
+            "UPDATE answers SET last_used = ? WHERE fingerprint = ? AND question = ?",
+            (time.time(), fingerprint, question),
+        )
+        self._conn.commit()
+
+    def _delete(self, fingerprint, question):
+        self._conn.execute("DELETE FROM answers WHERE fingerprint = ? AND question = ?", (fingerprint, question))
+        self._conn.commit()
+        self._unindex(fingerprint, question)
+
+    def _unindex(self, fingerprint, question):
+        index = self._similar.get(fingerprint)
+        if index is not None and question in index["tokens"]:
+            for token in index["tokens"].pop(question):
+                index["postings"][token].discard(question)
+
+    def _evict(self):
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            expired = self._conn.execute(
+                "SELECT fingerprint, question FROM answers WHERE created < ?", (cutoff,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (cutoff,))
+            for fingerprint, question in expired:
+                self._unindex(fingerprint, question)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT fingerprint, question, size FROM answers ORDER BY last_used").fetchall()
+        for fingerprint, question, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._delete(fingerprint, question)
+            total -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
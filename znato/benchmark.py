@@ -0,0 +1,369 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+from rich.console import Console
+from rich.table import Table
+
+from .synthetic import class_names, synthetic_documents, synthetic_extractions, synthetic_ontology, synthetic_rules
+
+REPORT_VERSION = 1
+
+# Inputs at --scale 1; every count is multiplied by the scale.
+SIZES = {
+    "classes": 2000,
+    "documents": 30,
+    "questions": 50,
+    "rules": 200,
+    "extractions": 2000,
+}
+CHUNKING_PASSES = 20
+
+class Case(NamedTuple):
+    name: str
+    unit: str
+    setup: Callable  # (workdir, sizes, options) -> state
+    run: Callable    # state -> (items, per-item latencies or None, extra metrics)
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+def timed(fn, items):
+    """Call fn on every item and return the per-item latencies."""
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+@contextmanager
+def quiet(module):
+    """Discard a module's console output (including from worker threads) while benchmarking."""
+    console = module.console
+    module.console = Console(file=io.StringIO())
+    try:
+        yield
+    finally:
+        module.console = console
+
+# --- Fixtures shared between cases ---
+
+def ontology_fixture(workdir: Path, sizes: dict) -> Path:
+    path = workdir / f"ontology_{sizes['classes']}.ttl"
+    if not path.exists():
+        synthetic_ontology(path, sizes["classes"])
+    return path
+
+def documents_fixture(workdir: Path, sizes: dict) -> Path:
+    folder = workdir / f"documents_{sizes['documents']}"
+    if not folder.exists():
+        synthetic_documents(folder, sizes["documents"])
+    return folder
+
+# --- Cases ---
+
+def setup_find_duplicates(workdir, sizes, options):
+    return {"path": str(ontology_fixture(workdir, sizes)), "classes": sizes["classes"]}
+
+def run_find_duplicates(state):
+    from .find_onto_duplicates import find_equivalent_classes
+
+    matches = find_equivalent_classes(state["path"], 0.85)
+    return state["classes"], None, {"matches": len(matches)}
+
+def setup_process_folder(workdir, sizes, options):
+    return {"folder": str(documents_fixture(workdir, sizes)), "documents": sizes["documents"]}
+
+def run_process_folder(state):
+    from . import generate_ontology as go
+
+    with quiet(go):
+        text = go.process_folder(state["folder"])
+    return state["documents"], None, {"characters": len(text)}
+
+def document_pieces(workdir, sizes):
+    from . import generate_ontology as go
+
+    files = go.list_supported_files(str(documents_fixture(workdir, sizes)))
+    with quiet(go):
+        return list(go.iter_document_pieces(files))
+
+def setup_chunking(workdir, sizes, options):
+    # Chunking is far faster than parsing, so it gets the corpus several times over.
+    return {"pieces": document_pieces(workdir, sizes) * CHUNKING_PASSES}
+
+def run_chunking(state):
+    from .generate_ontology import chunk_document_pieces
+
+    chunks = list(chunk_document_pieces(state["pieces"], 4000, 500))
+    return len(chunks), None, {}
+
+def run_token_chunking(state):
+    from .generate_ontology import chunk_document_pieces
+
+    chunks = list(chunk_document_pieces(state["pieces"], 0, chunk_tokens=1000, overlap_tokens=100))
+    return len(chunks), None, {}
+
+def setup_extraction(workdir, sizes, options):
+    from .generate_ontology import chunk_document_pieces
+    from .llm_standin import load_recordings
+
+    return {
+        "chunks": list(chunk_document_pieces(document_pieces(workdir, sizes), 4000, 500)),
+        "concurrency": options["concurrency"],
+        "recordings": load_recordings(options["recordings"]) if options["recordings"] else {},
+        "llm": options["llm"],
+    }
+
+def run_extraction(state):
+    from . import generate_ontology as go
+    from .llm_client import set_llm_client
+    from .llm_standin import StandInClient
+
+    # A fresh stand-in per run, so every run sees the same latencies and 429s.
+    client = StandInClient(state["recordings"], **state["llm"])
+    previous = set_llm_client(client)
+    failures = []
+    try:
+        with quiet(go):
+            graphs = go.iter_meta_graphs(state["chunks"], concurrency=state["concurrency"], failures=failures)
+            aggregated = go.aggregate_meta_graphs(graphs)
+    finally:
+        set_llm_client(previous)
+    extra = {
+        "requests": client.stats["requests"],
+        "rate_limited": client.stats["rate_limited"],
+        "failed": len(failures),
+        "concepts": len(aggregated.concepts),
+    }
+    return len(state["chunks"]), list(client.latencies), extra
+
+def setup_aggregation(workdir, sizes, options):
+    from .generate_ontology import MetaGraph
+
+    return {"graphs": [MetaGraph(**g) for g in synthetic_extractions(sizes["extractions"], vocabulary=sizes["classes"])]}
+
+def run_aggregation(state):
+    from .generate_ontology import aggregate_meta_graphs
+
+    aggregated = aggregate_meta_graphs(state["graphs"])
+    return len(state["graphs"]), None, {"concepts": len(aggregated.concepts), "relationships": len(aggregated.relationships)}
+
+def setup_build_prompt(workdir, sizes, options):
+    from .ontology_index import load_ontology_index
+
+    names = class_names(sizes["classes"])
+    questions = [f"What must happen before a {a} can be linked to a {b}?" for a, b in zip(names, reversed(names))]
+    return {
+        "ontology": load_ontology_index(str(ontology_fixture(workdir, sizes))),
+        "rules": synthetic_rules(names, sizes["rules"]),
+        "questions": questions[:sizes["questions"]],
+    }
+
+def run_build_prompt(state):
+    from .client import build_prompt
+
+    latencies = timed(lambda q: build_prompt(state["ontology"], state["rules"], q), state["questions"])
+    return len(state["questions"]), latencies, {}
+
+def setup_serialization(workdir, sizes, options, output="serialized.ttl"):
+    from .generate_ontology import aggregate_meta_graphs
+
+    graphs = setup_aggregation(workdir, sizes, options)["graphs"]
+    return {"meta_graph": aggregate_meta_graphs(graphs), "output": str(workdir / output)}
+
+def setup_ntriples(workdir, sizes, options):
+    return setup_serialization(workdir, sizes, options, output="serialized.nt")
+
+def run_serialization(state):
+    from . import generate_ontology as go
+
+    with quiet(go):
+        go.save_meta_graph(state["meta_graph"], state["output"])
+    items = len(state["meta_graph"].concepts) + len(state["meta_graph"].relationships)
+    return items, None, {"bytes": os.path.getsize(state["output"])}
+
+CASES = {
+    case.name: case
+    for case in (
+        Case("find_duplicates", "classes", setup_find_duplicates, run_find_duplicates),
+        Case("process_folder", "documents", setup_process_folder, run_process_folder),
+        Case("chunking", "chunks", setup_chunking, run_chunking),
+        Case("token_chunking", "chunks", setup_chunking, run_token_chunking),
+        Case("extraction", "chunks", setup_extraction, run_extraction),
+        Case("aggregation", "graphs", setup_aggregation, run_aggregation),
+        Case("build_prompt", "questions", setup_build_prompt, run_build_prompt),
+        Case("serialization", "entities", setup_serialization, run_serialization),
+        Case("ntriples", "entities", setup_ntriples, run_serialization),
+    )
+}
+
+# --- Running and reporting ---
+
+def measure(case: Case, state, repeat: int) -> dict:
+    """Time `repeat` runs after a warm-up, then one more under tracemalloc for peak memory.
+
+    Latency percentiles are over per-item latencies when the case reports
+    them (LLM calls, questions), otherwise over whole runs.
+    """
+    case.run(state)
+    timings, latencies = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items, item_latencies, extra = case.run(state)
+        timings.append(time.perf_counter() - start)
+        latencies.extend(item_latencies if item_latencies else [timings[-1]])
+
+    tracemalloc.start()
+    try:
+        case.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    seconds = percentile(timings, 50)
+    return {
+        "unit": case.unit,
+        "items": items,
+        "runs": repeat,
+        "seconds": seconds,
+        "throughput": items / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_mb": peak / (1024 * 1024),
+        **extra,
+    }
+
+def run_benchmarks(names, workdir: Path, scale: float = 1.0, repeat: int = 3, options: dict = None, console=None) -> dict:
+    sizes = {key: max(1, int(value * scale)) for key, value in SIZES.items()}
+    sizes["classes"] = max(sizes["classes"], 3)
+    report = {
+        "version": REPORT_VERSION,
+        "scale": scale,
+        "sizes": sizes,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": {},
+    }
+    for name in names:
+        case = CASES[name]
+        if console:
+            console.print(f"Running {name}...")
+        state = case.setup(workdir, sizes, options)
+        report["cases"][name] = measure(case, state, repeat)
+    return report
+
+def compare_reports(report: dict, baseline: dict, tolerance: float):
+    """Return rows (case, throughput ratio, memory ratio, status) against the baseline.
+
+    A case regresses when its throughput drops, or its peak memory grows, by
+    more than `tolerance`; cases run on other input sizes are not compared.
+    """
+    rows = []
+    for name, result in report["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None or base["items"] != result["items"] or baseline.get("sizes") != report["sizes"]:
+            rows.append((name, None, None, "not comparable"))
+            continue
+        speed = result["throughput"] / base["throughput"] if base["throughput"] else 1.0
+        memory = result["peak_mb"] / base["peak_mb"] if base["peak_mb"] else 1.0
+        regressed = speed < 1 - tolerance or memory > 1 + tolerance
+        rows.append((name, speed, memory, "regression" if regressed else "ok"))
+    return rows
+
+def print_report(report: dict, console: Console):
+    table = Table(title="Benchmarks", show_lines=True)
+    for column in ("Case", "Items", "Median s", "Throughput", "p50 ms", "p90 ms", "p99 ms", "Peak MB"):
+        table.add_column(column, justify="left" if column == "Case" else "right")
+    for name, r in report["cases"].items():
+        table.add_row(
+            name,
+            f"{r['items']} {r['unit']}",
+            f"{r['seconds']:.3f}",
+            f"{r['throughput']:.1f}/s",
+            f"{r['p50_ms']:.2f}",
+            f"{r['p90_ms']:.2f}",
+            f"{r['p99_ms']:.2f}",
+            f"{r['peak_mb']:.1f}",
+        )
+    console.print(table)
+
+def print_comparison(rows, console: Console):
+    table = Table(title="Against baseline", show_lines=True)
+    for column in ("Case", "Throughput", "Peak memory", "Status"):
+        table.add_column(column)
+    for name, speed, memory, status in rows:
+        style = {"ok": "green", "regression": "bold red"}.get(status, "yellow")
+        table.add_row(
+            name,
+            f"{speed:.2f}×" if speed is not None else "-",
+            f"{memory:.2f}×" if memory is not None else "-",
+            f"[{style}]{status}[/{style}]",
+        )
+    console.print(table)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark znato on synthetic ontologies and documents with an offline LLM stand-in."
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="Cases to run (default: all).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for all input sizes (default: 1.0).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (default: 3).")
+    parser.add_argument("--workdir", help="Directory for generated inputs, reused between runs (default: temporary).")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", help="JSON report to compare against; exits with 1 on a regression.")
+    parser.add_argument("--save_baseline", help="Also write the report to this baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput or memory regression (default: 0.2).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel extractions in the extraction case (default: 8).")
+    parser.add_argument("--recordings", help="Recorded LLM responses (JSONL) replayed by the stand-in.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency in seconds (default: 0.05).")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra random latency in seconds (default: 0.05).")
+    parser.add_argument("--rate_limit", type=float, default=0.02, help="Probability of a simulated 429 (default: 0.02).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the simulated latency and 429s (default: 0).")
+
+    parsed_args = parser.parse_args(args)
+    console = Console()
+    options = {
+        "concurrency": parsed_args.concurrency,
+        "recordings": parsed_args.recordings,
+        "llm": {
+            "latency": parsed_args.latency,
+            "jitter": parsed_args.jitter,
+            "rate_limit": parsed_args.rate_limit,
+            "retry_after": parsed_args.latency,
+            "seed": parsed_args.seed,
+        },
+    }
+
+    with tempfile.TemporaryDirectory(prefix="znato-bench-") as tmp:
+        workdir = Path(parsed_args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        # Keep ontology snapshots of generated inputs out of the user's cache.
+        os.environ["ZNATO_CACHE_DIR"] = str(workdir / "cache")
+        report = run_benchmarks(parsed_args.cases, workdir, parsed_args.scale, parsed_args.repeat, options, console)
+
+    print_report(report, console)
+    for path in (parsed_args.output, parsed_args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            console.print(f"Report written to {path}")
+
+    if parsed_args.baseline:
+        with open(parsed_args.baseline, "r", encoding="utf-8") as f:
+            rows = compare_reports(report, json.load(f), parsed_args.tolerance)
+        print_comparison(rows, console)
+        if any(status == "regression" for *_, status in rows):
+            sys.exit(1)
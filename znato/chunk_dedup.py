@@ -0,0 +1,75 @@
+import re
+import random
+import hashlib
+from collections import defaultdict
+
+_MAX_HASH = (1 << 64) - 1
+
+def shingles(text: str, size: int = 5) -> set:
+    """Return the set of character shingles of whitespace-normalised, lowercased text."""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def lsh_bands(threshold: float, num_perm: int):
+    """Pick (bands, rows) whose LSH S-curve crosses 50% closest to the threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        distance = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or distance < best[0]:
+            best = (distance, bands, rows)
+    return best[1], best[2]
+
+class NearDuplicateFilter:
+    """Streaming MinHash/LSH filter for near-duplicate texts.
+
+    is_duplicate() reports whether a text's estimated Jaccard similarity to
+    any previously kept text reaches the threshold; texts that are not
+    duplicates are remembered. Only the signatures of kept texts are stored.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = random.Random(seed)
+        # XOR with a random mask permutes well-mixed 64-bit hashes cheaply.
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        self._buckets = defaultdict(list)
+        self._signatures = []
+
+    def signature(self, text: str) -> tuple:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles(text, self.shingle_size)
+        ]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(min(map(mask.__xor__, hashes)) for mask in self._masks)
+
+    def is_duplicate(self, text: str) -> bool:
+        signature = self.signature(text)
+        keys = [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+        candidates = set()
+        for key in keys:
+            candidates.update(self._buckets.get(key, ()))
+        for k in candidates:
+            other = self._signatures[k]
+            agreement = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+            if agreement >= self.threshold:
+                return True
+
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for key in keys:
+            self._buckets[key].append(position)
+        return False
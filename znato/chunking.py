@@ -0,0 +1,179 @@
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character-based estimate
+    tiktoken = None
+
+_encodings = {}
+
+# Loaders for these suffixes yield arbitrary blocks of a plain-text file;
+# every other loader yields one page or paragraph per piece.
+PLAIN_TEXT_SUFFIXES = {".txt", ".md"}
+
+# Characters per token assumed when tiktoken is not available.
+CHARS_PER_TOKEN = 4
+
+_BLANK_LINE = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            _encodings[model] = None
+    return _encodings[model]
+
+def is_estimated(model: str = "gpt-4o") -> bool:
+    """True when count_tokens() can only estimate the tokens of model."""
+    return _encoding(model) is None
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count model tokens with tiktoken when available, else estimate ~4 characters per token."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def is_heading(text: str) -> bool:
+    """Heuristic: markdown headings, or a single short line without closing punctuation."""
+    if text.startswith("#"):
+        return True
+    return "\n" not in text and len(text) <= 80 and not text.rstrip().endswith((".", ",", ";", ":", "!", "?"))
+
+def _cut_point(text: str, start: int, end: int) -> int:
+    """Last line break, else space, in text[start + 1:end]; end if there is neither."""
+    for separator in ("\n", " "):
+        cut = text.rfind(separator, start + 1, end)
+        if cut > 0:
+            return cut
+    return end
+
+def iter_units(document_pieces: Iterable[Tuple[Path, str]], max_chars: int = 0) -> Iterator[Tuple[str, str]]:
+    """Turn (file, piece) pairs into structural units.
+
+    Yields (text, boundary) where boundary tells what precedes the unit:
+    "document" for the first unit of a file, "heading" for a heading and
+    "block" for any other paragraph or page. With max_chars, text held back
+    from a plain-text file while waiting for a paragraph break is flushed at
+    a line break (or space) once it grows past max_chars, so a file without
+    blank lines is still streamed in bounded memory.
+    """
+    current = None
+    carry = ""
+    first = True
+
+    def emit(texts):
+        nonlocal first
+        for text in texts:
+            text = text.strip()
+            if not text:
+                continue
+            boundary = "document" if first else ("heading" if is_heading(text) else "block")
+            first = False
+            yield text, boundary
+
+    for path, piece in document_pieces:
+        if path != current:
+            yield from emit([carry])
+            carry = ""
+            current = path
+            first = True
+        if path.suffix.lower() in PLAIN_TEXT_SUFFIXES:
+            # Blocks of a text file may end mid-paragraph, so hold back the tail.
+            parts = _BLANK_LINE.split(carry + piece)
+            carry = parts.pop()
+            yield from emit(parts)
+            if max_chars and len(carry) > max_chars:
+                start = 0
+                while len(carry) - start > max_chars:
+                    cut = _cut_point(carry, start, start + max_chars)
+                    yield from emit([carry[start:cut]])
+                    start = cut
+                carry = carry[start:]
+        else:
+            yield from emit([piece])
+    yield from emit([carry])
+
+def _pack(parts: List[str], separator: str, max_tokens: int, model: str) -> List[str]:
+    packed = []
+    current = ""
+    for part in parts:
+        candidate = f"{current}{separator}{part}" if current else part
+        if current and count_tokens(candidate, model) > max_tokens:
+            packed.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        packed.append(current)
+    return packed
+
+def split_oversized(text: str, max_tokens: int, model: str = "gpt-4o") -> List[str]:
+    """Split a unit larger than max_tokens at line, then sentence, then hard boundaries."""
+    for pattern, separator in ((r"\n", "\n"), (_SENTENCE_END, " ")):
+        parts = [p for p in re.split(pattern, text) if p.strip()]
+        if len(parts) > 1:
+            result = []
+            for part in _pack(parts, separator, max_tokens, model):
+                if count_tokens(part, model) > max_tokens:
+                    result.extend(split_oversized(part, max_tokens, model))
+                else:
+                    result.append(part)
+            return result
+
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    # count_tokens() estimates len // CHARS_PER_TOKEN + 1, so a piece must
+    # leave room for the extra token.
+    size = max(1, (max_tokens - 1) * CHARS_PER_TOKEN)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def iter_token_chunks(
+    units: Iterable[Tuple[str, str]],
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    model: str = "gpt-4o",
+) -> Iterator[str]:
+    """Pack structural units into chunks of at most max_tokens model tokens.
+
+    Units are never cut unless a single one exceeds the budget. A new chunk
+    is started at a document or heading boundary once the current chunk is at
+    least half full, and up to overlap_tokens of trailing units are repeated
+    at the start of the next chunk.
+    """
+    current = []
+    current_tokens = 0
+
+    for text, boundary in units:
+        tokens = count_tokens(text, model)
+        parts = [(text, tokens)] if tokens <= max_tokens else [
+            (part, count_tokens(part, model)) for part in split_oversized(text, max_tokens, model)
+        ]
+        for k, (part, part_tokens) in enumerate(parts):
+            starts_section = k == 0 and boundary in ("document", "heading")
+            full = current_tokens + part_tokens > max_tokens
+            if current and (full or (starts_section and current_tokens >= max_tokens // 2)):
+                yield "\n\n".join(t for t, _ in current)
+                overlap = []
+                overlap_total = 0
+                for item in reversed(current):
+                    if overlap_total + item[1] > overlap_tokens:
+                        break
+                    overlap.insert(0, item)
+                    overlap_total += item[1]
+                if overlap_total + part_tokens > max_tokens:
+                    overlap, overlap_total = [], 0
+                current, current_tokens = overlap, overlap_total
+            current.append((part, part_tokens))
+            current_tokens += part_tokens
+
+    if current:
+        yield "\n\n".join(t for t, _ in current)
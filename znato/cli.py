@@ -1,10 +1,60 @@
 import sys
+import time
+import importlib
+import subprocess
 from rich.console import Console
 
-from . import client
-from . import find_onto_duplicates
-from . import generate_ontology
-from . import generate_swrl
+# Command name -> module implementing it. Modules are imported only when
+# their command runs, so one command never pays for another's dependencies.
+COMMANDS = {
+    "benchmark": "benchmark",
+    "client": "client",
+    "find-duplicates": "find_onto_duplicates",
+    "generate-ontology": "generate_ontology",
+    "generate-swrl": "generate_swrl",
+}
+
+# Wall-clock budget in seconds for `znato <command> --help`, i.e. interpreter
+# start plus the command's imports. Targets leave headroom over the slowest
+# medians measured, so that timing noise alone does not push a command over.
+STARTUP_TARGETS = {
+    "benchmark": 1.0,
+    "client": 1.5,
+    "find-duplicates": 1.5,
+    "generate-ontology": 3.0,
+    "generate-swrl": 2.0,
+}
+
+def load_command(command):
+    """Import the module of a command and return its main function."""
+    module = importlib.import_module(f".{COMMANDS[command]}", __package__)
+    return module.main
+
+def measure_startup(repeat=5):
+    """Print the median `--help` time of every command against its target; returns False if any is over."""
+    table = []
+    for command in COMMANDS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-m", "znato.cli", command, "--help"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        table.append((command, timings[len(timings) // 2], STARTUP_TARGETS[command]))
+
+    console = Console()
+    within = True
+    for command, median, target in table:
+        ok = median <= target
+        within = within and ok
+        status = "[green]ok[/green]" if ok else "[bold red]over[/bold red]"
+        console.print(f"{command:<18} {median:6.2f}s  (target {target:.1f}s)  {status}")
+    return within
 
 def main():
     if len(sys.argv) < 2:
@@ -14,17 +64,12 @@ def main():
     command = sys.argv[1]
     args = sys.argv[2:]
 
-    if command == "client":
-        client.main(args)
-    elif command == "find-duplicates":
-        find_onto_duplicates.main(args)
-    elif command == "generate-ontology":
-        generate_ontology.main(args)
-    elif command == "generate-swrl":
-        generate_swrl.main(args)
-    else:
+    if command == "startup-time":
+        sys.exit(0 if measure_startup() else 1)
+    if command not in COMMANDS:
         Console().print(f"[bold red]Unknown command: {command}[/bold red]")
         sys.exit(1)
+    load_command(command)(args)
 
 if __name__ == "__main__":
     main()
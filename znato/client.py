@@ -1,38 +1,55 @@
 import os
+import sys
+import json
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from dotenv import load_dotenv
-from rdflib import Graph
-from openai import OpenAI
+
+from .answer_cache import AnswerCache
+from .chunking import count_tokens
+from .extraction_cache import cache_key
+from .fileutil import file_sha256
+from .llm_client import get_openai_client
+from .metrics import add_metrics_arguments, get_metrics, instrumented
+from .ontology_index import OntologyIndex, load_ontology_index
+from .ontology_snapshot import load_snapshot
+from .prompt_retrieval import PromptRetriever
+from .swrl_reasoner import SWRLReasoner
+from .swrl_rules import parse_rules
 
 # Load environment variables from .env file
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Brakuje klucza OPENAI_API_KEY w pliku .env")
-
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+ANSWER_MODEL = "gpt-4o"
+ANSWER_SYSTEM_PROMPT = "You are a precise semantic web expert."
+ANSWER_PARAMS = {
+    "temperature": 0,
+    "max_tokens": 1024,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+    "seed": 42, # Dodaj ten parametr z dowolną stałą liczbą całkowitą
+}
 
 def load_ontology(ttl_path):
-    g = Graph()
-    g.parse(ttl_path, format="ttl")
-    return g
+    return load_ontology_index(ttl_path)
 
 def load_swrl_rules(swrl_path):
     with open(swrl_path, "r", encoding="utf-8") as f:
         return f.read()
 
-def build_prompt(ontology_graph, swrl_rules, question):
-    classes = set()
-    properties = set()
-    for s, p, o in ontology_graph.triples((None, None, None)):
-        if str(p).endswith("type"):
-            if str(o).endswith("Class"):
-                classes.add(str(s).split("#")[-1])
-            elif str(o).endswith("ObjectProperty") or str(o).endswith("DatatypeProperty"):
-                properties.add(str(s).split("#")[-1])
-    classes_list = ", ".join(sorted(classes))
-    properties_list = ", ".join(sorted(properties))
+def build_prompt(ontology, swrl_rules, question):
+    if not isinstance(ontology, OntologyIndex):
+        ontology = OntologyIndex.from_graph(ontology)
+    return render_prompt(sorted(ontology.class_names()), sorted(ontology.property_names()), swrl_rules, question)
+
+def render_prompt(classes, properties, swrl_rules, question, inferences=""):
+    classes_list = ", ".join(classes)
+    properties_list = ", ".join(properties)
+    if inferences:
+        swrl_rules = f"{swrl_rules}\n\nFacts inferred locally from the ontology with these rules (verified derivations):\n{inferences}"
 
     prompt = f"""
 You are an expert in semantic web, OWL ontologies, and system modeling using SWRL rules.
@@ -66,25 +83,260 @@ Structure the answer clearly with numbered reasoning steps and refer to OWL enti
 """
     return prompt.strip()
 
+def complete(prompt):
+    with get_metrics().llm_request("answer", ANSWER_MODEL) as request:
+        response = get_openai_client().chat.completions.create(
+            model=ANSWER_MODEL,
+            messages=[
+                {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            **ANSWER_PARAMS
+        )
+        request.record(response)
+    return response.choices[0].message.content.strip()
+
 def ask_question(ontology_path, swrl_path, question):
-    ontology_graph = load_ontology(ontology_path)
+    ontology = load_ontology(ontology_path)
     swrl_rules = load_swrl_rules(swrl_path)
-    prompt = build_prompt(ontology_graph, swrl_rules, question)
-
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a precise semantic web expert."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0,
-        max_tokens=1024,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0,
-        seed=42 # Dodaj ten parametr z dowolną stałą liczbą całkowitą
-    )
-    return response.choices[0].message.content.strip()
+    prompt = build_prompt(ontology, swrl_rules, question)
+    return complete(prompt)
+
+class ClientSession:
+    """Ontology and SWRL rules loaded once and reused for many questions.
+
+    All questions share the module's OpenAI client and its connection pool;
+    at most `concurrency` requests to the model run at the same time. With a
+    prompt_budget, each prompt carries only the rules and entities retrieved
+    for its question, within that many tokens.
+
+    With an AnswerCache, answers are reused for repeated questions, and for
+    paraphrases when similarity_threshold is set. Cached answers are keyed by
+    a fingerprint of the ontology and rule file contents, the prompt and the
+    model parameters; answers from earlier versions of the same files are
+    deleted when the session starts.
+
+    With reason=True the rules are run over the ontology's individuals by a
+    local forward-chaining reasoner. Yes/no entailment questions are then
+    answered from the inferred facts without calling the model, and other
+    prompts carry the derivations of the inferred facts they mention.
+    """
+
+    def __init__(self, ontology_path, swrl_path, concurrency=4, prompt_budget=None, cache=None, similarity_threshold=None, reason=False):
+        metrics = get_metrics()
+        with metrics.span("load_ontology"):
+            self.ontology = load_ontology(ontology_path)
+        with metrics.span("load_rules"):
+            self.swrl_rules = load_swrl_rules(swrl_path)
+        self.classes = sorted(self.ontology.class_names())
+        self.properties = sorted(self.ontology.property_names())
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self.prompt_budget = prompt_budget
+        self.retriever = None
+        if prompt_budget:
+            with metrics.span("build_retriever"):
+                self.retriever = PromptRetriever(self.ontology, self.swrl_rules)
+                self.full_prompt_tokens = count_tokens(build_prompt(self.ontology, self.swrl_rules, ""))
+
+        self.reasoner = None
+        if reason:
+            with metrics.span("build_reasoner"):
+                self.reasoner = SWRLReasoner(load_snapshot(ontology_path), self.ontology, parse_rules(self.swrl_rules))
+
+        self.cache = cache
+        self.similarity_threshold = similarity_threshold
+        if cache:
+            # Only a change of the files themselves invalidates stored answers;
+            # other settings just select different entries.
+            self.content = cache_key(file_sha256(ontology_path), file_sha256(swrl_path))
+            self.fingerprint = cache_key(
+                self.content,
+                render_prompt(["{classes}"], ["{properties}"], "{rules}", "{question}"),
+                prompt_budget,
+                reason,
+                ANSWER_MODEL,
+                ANSWER_SYSTEM_PROMPT,
+                ANSWER_PARAMS,
+            )
+            self.source = cache_key(os.path.abspath(ontology_path), os.path.abspath(swrl_path))
+            cache.invalidate(self.source, self.content)
+
+    def prompt(self, question):
+        """Return the prompt for a question and, with retrieval, its size against the full prompt."""
+        inferences = self.reasoner.relevant_inferences(question) if self.reasoner else ""
+        if self.retriever is None:
+            return render_prompt(self.classes, self.properties, self.swrl_rules, question, inferences), {}
+        fixed_tokens = count_tokens(question) + (count_tokens(inferences) if inferences else 0)
+        full_tokens = self.full_prompt_tokens + fixed_tokens
+        if full_tokens <= self.prompt_budget:
+            prompt = render_prompt(self.classes, self.properties, self.swrl_rules, question, inferences)
+        else:
+            template_tokens = count_tokens(render_prompt([], [], "", question, inferences))
+            if template_tokens > self.prompt_budget:
+                print(
+                    f"Warning: the prompt takes {template_tokens} tokens without any rules or entities, "
+                    f"over the budget of {self.prompt_budget}",
+                    file=sys.stderr,
+                )
+            context_budget = max(0, self.prompt_budget - template_tokens)
+            rules, classes, properties = self.retriever.select(question, context_budget)
+            prompt = render_prompt(classes, properties, rules, question, inferences)
+        return prompt, {"prompt_tokens": count_tokens(prompt), "full_prompt_tokens": full_tokens}
+
+    def cached_answer(self, question):
+        if self.cache is None:
+            return None
+        answer = self.cache.get(self.fingerprint, question)
+        if answer is not None:
+            return {"answer": answer, "cached": True}
+        if self.similarity_threshold:
+            match = self.cache.get_similar(self.fingerprint, question, self.similarity_threshold)
+            if match is not None:
+                return {"answer": match[1], "cached": True, "cached_question": match[0]}
+        return None
+
+    def ask(self, question):
+        """Answer a question; returns {"answer": ...} plus cache and prompt size details."""
+        metrics = get_metrics()
+        with metrics.span("question"):
+            metrics.count("questions")
+            if self.reasoner is not None:
+                with metrics.span("reason"):
+                    answer = self.reasoner.answer(question)
+                if answer is not None:
+                    metrics.count("reasoned_answers")
+                    return {"answer": answer, "reasoned": True}
+            with metrics.span("cache_lookup"):
+                cached = self.cached_answer(question)
+            if cached is not None:
+                metrics.count("cached_answers")
+                return cached
+            with metrics.span("prompt"):
+                prompt, info = self.prompt(question)
+            with metrics.span("wait_for_slot"):
+                self._slots.acquire()
+            try:
+                answer = complete(prompt)
+            finally:
+                self._slots.release()
+            if self.cache is not None:
+                self.cache.put(self.fingerprint, question, answer, source=self.source, content=self.content)
+            return {"answer": answer, **info}
+
+def read_questions(lines):
+    """Parse JSONL question lines into {"id", "question"} dicts.
+
+    A line may be an object with a "question" and an optional "id", a JSON
+    string, or plain text. Blank lines are skipped and missing ids default
+    to the line number.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not isinstance(item.get("question"), str):
+            yield {"id": number, "error": "expected a JSON object with a \"question\" string"}
+            continue
+        yield {"id": item.get("id", number), "question": item["question"]}
+
+def answer_questions(session, questions, write, max_in_flight=0):
+    """Answer questions concurrently, passing each result to write() as soon as it is ready.
+
+    Results arrive in completion order and carry the question's id. At most
+    max_in_flight questions (default: twice the session concurrency) are
+    read from `questions` ahead of the answers, so a stdin stream is consumed
+    only as fast as it is answered.
+    """
+    lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(max(max_in_flight or 2 * session.concurrency, session.concurrency))
+
+    def emit(result):
+        with lock:
+            write(result)
+
+    def answer(item):
+        try:
+            emit({**item, **session.ask(item["question"])})
+        except Exception as e:
+            emit({**item, "error": str(e)})
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=session.concurrency) as executor:
+        for item in questions:
+            if "error" in item:
+                emit(item)
+                continue
+            in_flight.acquire()
+            executor.submit(answer, item)
+
+def jsonl_writer(stream):
+    def write(result):
+        stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        stream.flush()
+    return write
+
+def serve_http(session, host="127.0.0.1", port=8000):
+    """Answer POST requests with a JSON body {"question": ...} until interrupted."""
+
+    class QuestionHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                data = get_metrics().prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                question = body["question"]
+                if not isinstance(question, str):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {"error": "expected a JSON object with a \"question\" string"})
+                return
+            try:
+                result = session.ask(question)
+            except Exception as e:
+                self.send_json(502, {"question": question, "error": str(e)})
+                return
+            self.send_json(200, {"question": question, **result})
+
+        def log_message(self, format, *args):
+            sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+    server = ThreadingHTTPServer((host, port), QuestionHandler)
+    server.daemon_threads = True
+    print(f"Serving questions on http://{host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 def main(args=None):
     parser = argparse.ArgumentParser(
@@ -92,10 +344,68 @@ def main(args=None):
     )
     parser.add_argument("-o", "--ontology", required=True, help="Path to ontology TTL file")
     parser.add_argument("-s", "--swrl", required=True, help="Path to SWRL rules file")
-    parser.add_argument("-q", "--question", required=True, help="Question to ask")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("-q", "--question", help="Question to ask")
+    mode.add_argument("--questions", help="JSONL file of questions to answer; answers are written as JSONL")
+    mode.add_argument("--serve", action="store_true", help="Answer JSONL questions from stdin until EOF")
+    mode.add_argument("--http", type=int, metavar="PORT", help="Serve questions over HTTP on this port")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind with --http")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered in parallel in batch and server modes")
+    parser.add_argument("--output", help="Write JSONL answers to this file instead of stdout")
+    parser.add_argument("--prompt_budget", type=int, help="Token budget per prompt; only the rules and entities relevant to the question are included")
+    parser.add_argument("--reason", action="store_true", help="Run the SWRL rules locally; entailment questions are answered without the model")
+    parser.add_argument("--cache", default=None, help="SQLite file caching answers, reused while the ontology and rules are unchanged")
+    parser.add_argument("--cache_size_mb", type=float, default=256, help="Maximum answer cache size in MB before LRU eviction")
+    parser.add_argument("--cache_max_age_hours", type=float, default=None, help="Ignore and drop cached answers older than this")
+    parser.add_argument("--similarity_threshold", type=float, default=None, help="Also reuse answers to cached questions at least this similar (0-1)")
+    add_metrics_arguments(parser)
 
     parsed_args = parser.parse_args(args)  # <--- najważniejsza linia
 
-    # Teraz możesz bezpiecznie używać parsed_args
-    answer = ask_question(parsed_args.ontology, parsed_args.swrl, parsed_args.question)
-    print(answer)
+    cache = None
+    if parsed_args.cache:
+        max_age = parsed_args.cache_max_age_hours * 3600 if parsed_args.cache_max_age_hours is not None else None
+        cache = AnswerCache(parsed_args.cache, int(parsed_args.cache_size_mb * 1024 * 1024), max_age)
+    try:
+        with instrumented("client", parsed_args):
+            run_client(parsed_args, cache)
+    finally:
+        if cache:
+            cache.close()
+
+def run_client(parsed_args, cache):
+    session = ClientSession(
+        parsed_args.ontology,
+        parsed_args.swrl,
+        concurrency=parsed_args.concurrency,
+        prompt_budget=parsed_args.prompt_budget,
+        cache=cache,
+        similarity_threshold=parsed_args.similarity_threshold,
+        reason=parsed_args.reason,
+    )
+    if parsed_args.question is not None:
+        result = session.ask(parsed_args.question)
+        print(result["answer"])
+        if "prompt_tokens" in result:
+            share = result["prompt_tokens"] / max(result["full_prompt_tokens"], 1)
+            print(
+                f"Prompt: {result['prompt_tokens']} tokens "
+                f"(full prompt: {result['full_prompt_tokens']} tokens, {share:.0%})",
+                file=sys.stderr,
+            )
+        return
+
+    if parsed_args.http is not None:
+        serve_http(session, parsed_args.host, parsed_args.http)
+        return
+
+    out = open(parsed_args.output, "w", encoding="utf-8") if parsed_args.output else sys.stdout
+    try:
+        if parsed_args.serve:
+            answer_questions(session, read_questions(sys.stdin), jsonl_writer(out))
+        else:
+            with open(parsed_args.questions, "r", encoding="utf-8") as f:
+                answer_questions(session, read_questions(f), jsonl_writer(out))
+    finally:
+        if out is not sys.stdout:
+            out.close()
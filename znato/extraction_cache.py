@@ -0,0 +1,86 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+def cache_key(*parts) -> str:
+    """Return a content hash for any JSON-serialisable key parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ExtractionCache:
+    """Persistent SQLite cache of validated chunk extractions.
+
+    Entries are keyed by a content hash, evicted least-recently-used once the
+    stored payloads exceed max_bytes, and failed extractions are kept in a
+    separate table so that a rerun knows what still has to be retried.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS failures ("
+            "key TEXT PRIMARY KEY, label TEXT, error TEXT, failed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Return the cached value for key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """Store a JSON-serialisable value and clear any failure recorded for key."""
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def record_failure(self, key: str, label: str, error: str):
+        """Remember that the extraction for key failed, so a rerun retries it."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failures (key, label, error, failed_at) VALUES (?, ?, ?, ?)",
+                (key, label, error, time.time()),
+            )
+            self._conn.commit()
+
+    def failures(self):
+        """Return (key, label, error) for every extraction still marked as failed."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, label, error FROM failures ORDER BY failed_at"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,41 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+
+# mkstemp creates files readable by their owner only; written files get the
+# mode open() would have given them instead.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def write_atomic(path, data):
+    """Replace the file at path with data (bytes, or str written as UTF-8) in one step.
+
+    The data is written to a temporary file with a unique name in the same
+    directory and then renamed over path, so readers see either the old or
+    the new contents and concurrent writers never rename each other's file.
+    """
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+def write_json_atomic(path, value, **options):
+    """Write value as UTF-8 JSON with write_atomic(); options are passed to json.dumps()."""
+    write_atomic(path, json.dumps(value, ensure_ascii=False, **options))
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -1,91 +1,596 @@
+import os
+import json
+import math
+import heapq
 import argparse
-from rdflib import Graph, RDF, RDFS, OWL
-from rdflib.namespace import split_uri
+from pathlib import Path
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from rdflib import URIRef
 from difflib import SequenceMatcher
 from rich.console import Console
 from rich.table import Table
 
+from .fileutil import write_json_atomic
+from .metrics import add_metrics_arguments, get_metrics, instrumented
+from .ontology_index import load_ontology_index
+
 def similar(a: str, b: str) -> float:
     """Return similarity ratio between two strings."""
+    # ratio() is not symmetric, so score in a fixed order to keep results stable.
+    if b < a:
+        a, b = b, a
     return SequenceMatcher(None, a, b).ratio()
 
-def get_label_or_localname(g, node):
-    """Get rdfs:label if exists, otherwise local part of URI."""
-    for _, _, label in g.triples((node, RDFS.label, None)):
-        return str(label)
-    try:
-        _, local = split_uri(node)
-        return local
-    except Exception:
-        return str(node)
-
-def find_equivalent_classes(ttl_file: str, similarity_threshold: float = 0.8):
-    g = Graph()
-    g.parse(ttl_file, format="turtle")
-
-    classes = set()
-
-    for s, _, _ in g.triples((None, RDF.type, OWL.Class)):
-        classes.add(s)
-    for s, _, _ in g.triples((None, RDF.type, RDFS.Class)):
-        classes.add(s)
-    for s, _, o in g.triples((None, RDFS.subClassOf, None)):
-        classes.add(s)
-        classes.add(o)
-
-    classes = list(classes)
+def all_pairs(n: int):
+    """Yield every index pair (i, j) with i < j, in brute-force order."""
+    for i in range(n):
+        for j in range(i + 1, n):
+            yield i, j
+
+def explicit_pairs(classes, explicit):
+    """Return index pairs (i, j), i < j, linked by owl:equivalentClass."""
+    positions = defaultdict(list)
+    for i, c in enumerate(classes):
+        positions[c].append(i)
+    pairs = set()
+    for c1, c2 in explicit:
+        for i in positions.get(c1, ()):
+            for j in positions.get(c2, ()):
+                if i != j:
+                    pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+def char_tokens(label: str):
+    """Turn a label into a list of (char, occurrence) tokens.
+
+    The size of the intersection of two such token sets equals the size of the
+    multiset intersection of the characters, which is the upper bound
+    SequenceMatcher.quick_ratio() uses for the number of matching characters.
+    """
+    seen = Counter()
+    tokens = []
+    for ch in label:
+        tokens.append((ch, seen[ch]))
+        seen[ch] += 1
+    return tokens
+
+def encode_labels(labels):
+    """Encode every label once as a tuple of integer token ids, rarest token first."""
+    tokens = [char_tokens(label) for label in labels]
+    frequency = Counter(t for toks in tokens for t in toks)
+    vocabulary = {t: k for k, t in enumerate(sorted(frequency, key=lambda t: (frequency[t], t)))}
+    return [tuple(sorted(vocabulary[t] for t in toks)) for toks in tokens]
+
+def min_overlap(length: int, similarity_threshold: float) -> int:
+    """Smallest shared-character count a label of this length needs with any partner."""
+    # ratio = 2M / (la + lb) and M <= min(la, lb), so the partner is at least
+    # la * t / (2 - t) long and M must be at least t * la / (2 - t).
+    return max(math.ceil(similarity_threshold * length / (2 - similarity_threshold) - 1e-9), 1)
+
+def build_prefix_index(encoded, similarity_threshold: float):
+    """Map token ids to the labels that carry them in their filtering prefix.
+
+    Two labels can only share enough characters to reach the threshold if
+    their prefixes of rarest tokens share at least one token.
+    """
+    index = defaultdict(list)
+    for i, ids in enumerate(encoded):
+        for t in ids[:len(ids) - min_overlap(len(ids), similarity_threshold) + 1]:
+            index[t].append(i)
+    return index
+
+_block_state = {}
+
+def init_block_scorer(labels, encoded, similarity_threshold: float, groups=None):
+    """Prepare the per-process state used by score_block().
+
+    With groups (one group id per label) only labels of different groups
+    are paired.
+    """
+    _block_state.clear()
+    _block_state.update(
+        labels=labels,
+        encoded=encoded,
+        token_sets=[frozenset(ids) for ids in encoded],
+        empty=[i for i, label in enumerate(labels) if not label],
+        threshold=similarity_threshold,
+        index=build_prefix_index(encoded, similarity_threshold) if similarity_threshold > 0 else None,
+        groups=groups,
+    )
+
+def score_block(rows):
+    """Score one block of rows against their candidates.
+
+    Every pair is produced by exactly one of its two rows, so the blocks can
+    be scored independently. Returns (i, j, similarity) triples with i < j
+    for the pairs that reach the threshold.
+    """
+    labels = _block_state["labels"]
+    encoded = _block_state["encoded"]
+    token_sets = _block_state["token_sets"]
+    threshold = _block_state["threshold"]
+    index = _block_state["index"]
+    groups = _block_state["groups"]
+
+    matches = []
+    for i in rows:
+        length = len(labels[i])
+        if index is None:
+            candidates = range(i)
+        elif not length:
+            candidates = [j for j in _block_state["empty"] if j < i]
+        else:
+            ids = encoded[i]
+            prefix = ids[:length - min_overlap(length, threshold) + 1]
+            candidates = set()
+            for t in prefix:
+                candidates.update(index[t])
+            # The partner with the shorter (or equal and earlier) label owns the pair.
+            candidates = [j for j in candidates if (len(labels[j]), j) < (length, i)]
+        if groups is not None:
+            candidates = [j for j in candidates if groups[j] != groups[i]]
+
+        for j in candidates:
+            bound = threshold * (len(labels[j]) + length) - 1e-9
+            if 2 * min(len(labels[j]), length) < bound:
+                continue
+            if 2 * len(token_sets[i] & token_sets[j]) < bound:
+                continue
+            a, b = min(i, j), max(i, j)
+            sim = similar(labels[a], labels[b])
+            if sim >= threshold:
+                matches.append((a, b, sim))
+    return matches
+
+def score_label_pairs(labels, similarity_threshold: float, workers: int = 1, block_size: int = 1024, groups=None):
+    """Yield (i, j, similarity) for every label pair that reaches the threshold.
+
+    Labels are encoded once, rows are scored in blocks of block_size and the
+    blocks are spread over a process pool when workers > 1, so memory grows
+    with the block size rather than with the number of pairs. With groups
+    only pairs across groups are scored.
+    """
+    encoded = encode_labels(labels)
+    blocks = [range(k, min(k + block_size, len(labels))) for k in range(0, len(labels), block_size)]
+
+    if workers <= 1:
+        init_block_scorer(labels, encoded, similarity_threshold, groups)
+        for rows in blocks:
+            yield from score_block(rows)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_block_scorer,
+        initargs=(labels, encoded, similarity_threshold, groups),
+    ) as executor:
+        for matches in executor.map(score_block, blocks):
+            yield from matches
+
+def keep_top_k(matches, top_k: int):
+    """Keep the pairs that are among the top_k best matches of either class."""
+    best = defaultdict(list)
+    for i, j, sim in matches:
+        for a, b in ((i, j), (j, i)):
+            heap = best[a]
+            item = (sim, -b)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    kept = {}
+    for a, heap in best.items():
+        for sim, negative_b in heap:
+            b = -negative_b
+            kept[(min(a, b), max(a, b))] = sim
+    return [(i, j, sim) for (i, j), sim in kept.items()]
+
+def load_class_table(ttl_file: str):
+    """Parse a TTL file into its classes, lowercased labels and explicit equivalences."""
+    index = load_ontology_index(ttl_file)
+
+    classes = [index.term(k) for k in index.classes]
+    labels = [index.label_or_localname(k).lower() for k in index.classes]
+
+    explicit = set()
+    for s, o in index.equivalent_pairs:
+        explicit.add((index.term(s), index.term(o)))
+        explicit.add((index.term(o), index.term(s)))
+
+    return classes, labels, explicit
+
+# --- Several ontologies ---
+
+def expand_ttl_paths(paths):
+    """Replace directories by the .ttl files below them, dropping repeated files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(str(p) for p in Path(path).rglob("*.ttl")))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+def load_class_tables(ttl_files, workers: int = 1):
+    """Parse every TTL file into its class table, in worker processes when workers > 1."""
+    if workers <= 1 or len(ttl_files) <= 1:
+        return [load_class_table(path) for path in ttl_files]
+    with ProcessPoolExecutor(max_workers=min(workers, len(ttl_files))) as executor:
+        return list(executor.map(load_class_table, ttl_files))
+
+def join_class_tables(tables):
+    """Concatenate class tables into one, with the table number of every class.
+
+    Explicit equivalences are pooled, so an owl:equivalentClass declared in
+    one file also links classes defined in others.
+    """
+    classes, labels, groups, explicit = [], [], [], set()
+    for group, (table_classes, table_labels, table_explicit) in enumerate(tables):
+        classes.extend(table_classes)
+        labels.extend(table_labels)
+        groups.extend([group] * len(table_classes))
+        explicit |= table_explicit
+    return classes, labels, groups, explicit
+
+def cluster_equivalents(equivalents):
+    """Group equivalent pairs into clusters of transitively equivalent classes with union-find.
+
+    Members are classes, or (class, source file) for results across several
+    files. Clusters are sorted, largest first.
+    """
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for entry in equivalents:
+        a, b = ((entry[0], entry[3]), (entry[1], entry[4])) if len(entry) == 5 else entry[:2]
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    clusters = defaultdict(list)
+    for x in parent:
+        clusters[find(x)].append(x)
+    return sorted((sorted(members) for members in clusters.values()), key=lambda members: (-len(members), members[0]))
+
+# --- Persistent duplicate index ---
+
+DUPLICATE_INDEX_VERSION = 1
+
+def token_key(token) -> str:
+    ch, occurrence = token
+    return f"{occurrence}:{ch}"
+
+def new_duplicate_index():
+    return {
+        "version": DUPLICATE_INDEX_VERSION,
+        "classes": [],
+        "labels": [],
+        "postings": {},
+        "equivalent": [],
+    }
+
+def index_class(index, uri: str, label: str, position=None):
+    """Add a class to the duplicate index, or replace the label of an indexed one."""
+    postings = index["postings"]
+    if position is None:
+        position = len(index["classes"])
+        index["classes"].append(uri)
+        index["labels"].append(label)
+    else:
+        for token in char_tokens(index["labels"][position]):
+            postings[token_key(token)].remove(position)
+        index["labels"][position] = label
+    for token in char_tokens(label):
+        postings.setdefault(token_key(token), []).append(position)
+    return position
+
+def build_duplicate_index(classes, labels, explicit):
+    """Build the duplicate index for the classes of a fully scanned ontology."""
+    index = new_duplicate_index()
+    for c, label in zip(classes, labels):
+        index_class(index, str(c), label)
+    index["equivalent"] = sorted({tuple(sorted((str(a), str(b)))) for a, b in explicit if a != b})
+    return index
+
+def prune_duplicate_index(index, keep):
+    """Return the index rebuilt with only the classes whose URIs are in `keep`."""
+    pruned = new_duplicate_index()
+    for uri, label in zip(index["classes"], index["labels"]):
+        if uri in keep:
+            index_class(pruned, uri, label)
+    pruned["equivalent"] = [pair for pair in index["equivalent"] if pair[0] in keep and pair[1] in keep]
+    return pruned
+
+def save_duplicate_index(index, index_path: str):
+    write_json_atomic(index_path, index)
+
+def load_duplicate_index(index_path: str):
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != DUPLICATE_INDEX_VERSION:
+        raise ValueError(f"Unsupported duplicate index version in {index_path}")
+    return index
+
+def indexed_matches(index, label: str, similarity_threshold: float, skip=None):
+    """Yield (position, similarity) for indexed classes whose label reaches the threshold."""
+    labels = index["labels"]
+    postings = index["postings"]
+    length = len(label)
+
+    if similarity_threshold <= 0:
+        candidates = range(len(labels))
+    elif not length:
+        candidates = [k for k, other in enumerate(labels) if not other]
+    else:
+        # Any label sharing enough characters must carry one of the rarest
+        # length - min_overlap + 1 tokens of this label.
+        tokens = sorted(
+            (token_key(t) for t in char_tokens(label)),
+            key=lambda key: (len(postings.get(key, ())), key),
+        )
+        candidates = set()
+        for key in tokens[:length - min_overlap(length, similarity_threshold) + 1]:
+            candidates.update(postings.get(key, ()))
+
+    token_set = set(char_tokens(label))
+    for k in candidates:
+        if k == skip:
+            continue
+        other = labels[k]
+        bound = similarity_threshold * (len(other) + length) - 1e-9
+        if 2 * min(len(other), length) < bound:
+            continue
+        if 2 * len(token_set & set(char_tokens(other))) < bound:
+            continue
+        sim = similar(other, label)
+        if sim >= similarity_threshold:
+            yield k, sim
+
+def check_new_classes(ttl_file: str, index_path: str, similarity_threshold: float = 0.8, prune: bool = False):
+    """Check only new or relabelled classes of ttl_file against a duplicate index.
+
+    ttl_file may hold the whole ontology or just the recently added classes.
+    Classes already indexed with the same label are skipped; the rest are
+    scored against the index, and the index is updated in place. With prune,
+    ttl_file must hold the whole ontology: indexed classes missing from it
+    are removed from the index before scoring.
+    """
+    metrics = get_metrics()
+    with metrics.span("load_index"):
+        index = load_duplicate_index(index_path)
+    with metrics.span("load"):
+        classes, labels, explicit = load_class_table(ttl_file)
+    metrics.count("classes", len(classes))
+
+    if prune:
+        present = {str(c) for c in classes}
+        removed = sum(1 for uri in index["classes"] if uri not in present)
+        if removed:
+            index = prune_duplicate_index(index, present)
+        metrics.count("pruned_classes", removed)
+
+    positions = {uri: k for k, uri in enumerate(index["classes"])}
+    known_pairs = {tuple(pair) for pair in index["equivalent"]}
     equivalents = []
 
-    for i in range(len(classes)):
-        for j in range(i + 1, len(classes)):
-            c1, c2 = classes[i], classes[j]
+    declared = set(positions).union(str(c) for c in classes)
+    for a, b in sorted(explicit):
+        pair = tuple(sorted((str(a), str(b))))
+        if a != b and pair not in known_pairs and set(pair) <= declared:
+            known_pairs.add(pair)
+            equivalents.append((URIRef(pair[0]), URIRef(pair[1]), "explicit owl:equivalentClass"))
 
-            if (c1, OWL.equivalentClass, c2) in g or (c2, OWL.equivalentClass, c1) in g:
-                equivalents.append((c1, c2, "explicit owl:equivalentClass"))
+    with metrics.span("score"):
+        for c, label in zip(classes, labels):
+            uri = str(c)
+            position = positions.get(uri)
+            if position is not None and index["labels"][position] == label:
                 continue
 
-            label1 = get_label_or_localname(g, c1).lower()
-            label2 = get_label_or_localname(g, c2).lower()
+            for k, sim in indexed_matches(index, label, similarity_threshold, skip=position):
+                other = index["classes"][k]
+                if tuple(sorted((other, uri))) in known_pairs:
+                    continue
+                equivalents.append((URIRef(other), c, f"label similarity {sim:.2f}"))
 
-            sim = similar(label1, label2)
-            if sim >= similarity_threshold:
-                equivalents.append((c1, c2, f"label similarity {sim:.2f}"))
+            positions[uri] = index_class(index, uri, label, position)
 
+    index["equivalent"] = sorted(known_pairs)
+    with metrics.span("save_index"):
+        save_duplicate_index(index, index_path)
     return equivalents
 
+def find_equivalent_classes(
+    ttl_file,
+    similarity_threshold: float = 0.8,
+    brute_force: bool = False,
+    workers: int = 1,
+    top_k: int = None,
+    block_size: int = 1024,
+    index_path: str = None,
+    cross_only: bool = False,
+    parse_workers: int = None,
+):
+    """Find equivalent classes in one TTL file, or across several.
+
+    ttl_file is a TTL file path, or a directory or list of files and
+    directories. A single file gives (class1, class2, reason) results.
+    Several files are parsed in parallel (parse_workers processes, by
+    default workers) and joined into one class table. Each result is then
+    (class1, class2, reason, source1, source2), naming the files the two
+    classes come from; with cross_only only pairs from different files are
+    reported.
+    """
+    metrics = get_metrics()
+    single = isinstance(ttl_file, str) and not os.path.isdir(ttl_file)
+    ttl_files = [ttl_file] if single else expand_ttl_paths([ttl_file] if isinstance(ttl_file, str) else ttl_file)
+    if index_path and not single:
+        raise ValueError("The duplicate index supports a single TTL file")
+
+    with metrics.span("load"):
+        if single:
+            classes, labels, explicit = load_class_table(ttl_file)
+            groups = None
+        else:
+            tables = load_class_tables(ttl_files, parse_workers or workers)
+            classes, labels, groups, explicit = join_class_tables(tables)
+    metrics.count("files", len(ttl_files))
+    metrics.count("classes", len(classes))
+    if index_path:
+        with metrics.span("save_index"):
+            save_duplicate_index(build_duplicate_index(classes, labels, explicit), index_path)
+
+    pair_groups = groups if cross_only else None
+    if brute_force:
+        scored = (
+            (i, j, similar(labels[i], labels[j]))
+            for i, j in all_pairs(len(classes))
+            if pair_groups is None or pair_groups[i] != pair_groups[j]
+        )
+        scored = (m for m in scored if m[2] >= similarity_threshold)
+    else:
+        scored = score_label_pairs(labels, similarity_threshold, workers, block_size, pair_groups)
+    matches = ((i, j, sim) for i, j, sim in metrics.timed_iter("score", scored) if (classes[i], classes[j]) not in explicit)
+
+    if top_k:
+        matches = keep_top_k(matches, top_k)
+
+    results = {
+        (i, j): "explicit owl:equivalentClass"
+        for i, j in explicit_pairs(classes, explicit)
+        if pair_groups is None or pair_groups[i] != pair_groups[j]
+    }
+    for i, j, sim in matches:
+        results[(i, j)] = f"label similarity {sim:.2f}"
+
+    if single:
+        return [(classes[i], classes[j], results[(i, j)]) for i, j in sorted(results)]
+    return [
+        (classes[i], classes[j], results[(i, j)], ttl_files[groups[i]], ttl_files[groups[j]])
+        for i, j in sorted(results)
+    ]
+
 def print_equivalent_classes(equivalents):
     console = Console()
     table = Table(title="Equivalent RDF Classes", show_lines=True)
 
+    with_sources = any(len(entry) == 5 for entry in equivalents)
     table.add_column("Class 1", style="cyan", overflow="fold")
     table.add_column("Class 2", style="cyan", overflow="fold")
     table.add_column("Reason", style="green", overflow="fold")
+    if with_sources:
+        table.add_column("Source 1", style="magenta", overflow="fold")
+        table.add_column("Source 2", style="magenta", overflow="fold")
 
-    for c1, c2, reason in equivalents:
-        table.add_row(str(c1), str(c2), reason)
+    for entry in equivalents:
+        table.add_row(*(str(value) for value in entry))
 
     console.print(table)
 
-import argparse
-from .find_equivalent_classes import find_equivalent_classes, print_equivalent_classes
-
 def main(args=None):
     parser = argparse.ArgumentParser(
-        description="Detect equivalent RDF classes in a TTL ontology."
+        description="Detect equivalent RDF classes in a TTL ontology, or across several."
+    )
+    parser.add_argument(
+        "ttl_files", nargs="+",
+        help="Paths to TTL ontology files, or directories searched for *.ttl files."
     )
-    parser.add_argument("ttl_file", help="Path to the TTL ontology file.")
     parser.add_argument(
         "--similarity", "-s", type=float, default=0.8,
         help="Similarity threshold for label matching (default: 0.8)."
     )
+    parser.add_argument(
+        "--brute-force", action="store_true",
+        help="Score every pair of classes instead of using candidate blocking (for verification)."
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=1,
+        help="Number of worker processes used for similarity scoring (default: 1)."
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=None,
+        help="Number of worker processes parsing the TTL files (default: --workers)."
+    )
+    parser.add_argument(
+        "--cross-only", action="store_true",
+        help="With several TTL files, report only matches between classes from different files."
+    )
+    parser.add_argument(
+        "--clusters", action="store_true",
+        help="Group the matches into clusters of equivalent classes instead of listing pairs."
+    )
+    parser.add_argument(
+        "--top-k", "-k", type=int, default=None,
+        help="Report only the k best label matches per class."
+    )
+    parser.add_argument(
+        "--block-size", type=int, default=1024,
+        help="Number of classes scored per block (default: 1024)."
+    )
+    parser.add_argument(
+        "--index",
+        help="Path to the duplicate index; written after a full scan, read and updated with --incremental."
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Check only new or changed classes in ttl_file against --index and update it in place."
+    )
+    parser.add_argument(
+        "--prune", action="store_true",
+        help="With --incremental, remove indexed classes missing from ttl_file, which must hold the whole ontology."
+    )
+    add_metrics_arguments(parser)
 
     parsed_args = parser.parse_args(args)
+    if parsed_args.incremental and not parsed_args.index:
+        parser.error("--incremental requires --index")
+    if parsed_args.prune and not parsed_args.incremental:
+        parser.error("--prune requires --incremental")
+    single = len(parsed_args.ttl_files) == 1 and not os.path.isdir(parsed_args.ttl_files[0])
+    if parsed_args.index and not single:
+        parser.error("--index and --incremental take a single TTL file")
+    with instrumented("find-duplicates", parsed_args) as metrics:
+        run_find_duplicates(parsed_args, metrics)
 
-    eq_classes = find_equivalent_classes(parsed_args.ttl_file, parsed_args.similarity)
-    if eq_classes:
-        for c1, c2, reason in eq_classes:
-            print(f"{c1} <--> {c2} | {reason}")
+def run_find_duplicates(parsed_args, metrics):
+    ttl_files = parsed_args.ttl_files
+    if parsed_args.incremental:
+        eq_classes = check_new_classes(ttl_files[0], parsed_args.index, parsed_args.similarity, prune=parsed_args.prune)
     else:
+        eq_classes = find_equivalent_classes(
+            ttl_files[0] if len(ttl_files) == 1 else ttl_files,
+            parsed_args.similarity,
+            brute_force=parsed_args.brute_force,
+            workers=parsed_args.workers,
+            top_k=parsed_args.top_k,
+            block_size=parsed_args.block_size,
+            index_path=parsed_args.index,
+            cross_only=parsed_args.cross_only,
+            parse_workers=parsed_args.parse_workers,
+        )
+    metrics.count("matches", len(eq_classes))
+    if not eq_classes:
         print("No equivalent classes detected.")
+    elif parsed_args.clusters:
+        for number, members in enumerate(cluster_equivalents(eq_classes), start=1):
+            print(f"Cluster {number} ({len(members)} classes):")
+            for member in members:
+                print(f"  {member[0]} ({member[1]})" if isinstance(member, tuple) else f"  {member}")
+    else:
+        for entry in eq_classes:
+            if len(entry) == 5:
+                c1, c2, reason, source1, source2 = entry
+                print(f"{c1} ({source1}) <--> {c2} ({source2}) | {reason}")
+            else:
+                c1, c2, reason = entry
+                print(f"{c1} <--> {c2} | {reason}")
 
 
@@ -7,24 +7,31 @@ from pathlib import Path
 from slugify import slugify
 from dotenv import load_dotenv
 from docx import Document
-from openai import OpenAI
-from rdflib import Graph, Namespace, RDF, RDFS
 from pydantic import BaseModel, ValidationError, Field
-from typing import List
+from typing import Iterable, Iterator, List
 from rich.console import Console
 from rich.panel import Panel
+from rich.table import Table
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import time
+import tempfile
 import subprocess  # ✅ konwersja .doc -> .docx
 
+from .rate_limiter import RateLimiter, is_transient_error, retry_after_seconds
+from .extraction_cache import ExtractionCache, cache_key
+from .fileutil import file_sha256, write_json_atomic
+from .chunk_dedup import NearDuplicateFilter
+from .chunking import CHARS_PER_TOKEN, count_tokens, is_estimated, iter_units, iter_token_chunks
+from .llm_client import get_openai_client
+from .meta_graph import OUTPUT_FORMATS, MetaGraphAggregator, guess_format, write_ontology
+from .metrics import add_metrics_arguments, get_metrics, instrumented
+
 # --- Konfiguracja środowiska ---
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Brakuje klucza OPENAI_API_KEY w pliku .env")
 
 # ✅ wyłączenie spinnerów i kolorów w rich
 console = Console(force_terminal=False, no_color=True)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 _pandoc_download_attempted = False
 _pandoc_path = None
@@ -67,6 +74,13 @@ Text:
 \"\"\"{text}\"\"\"
 """
 
+LLM_MODEL = "gpt-4o"
+LLM_PARAMS = {
+    "temperature": 0,
+    "max_tokens": 1000,
+    "response_format": {"type": "json_object"},
+}
+
 class Concept(BaseModel):
     id: str
 
@@ -81,8 +95,46 @@ class MetaGraph(BaseModel):
 
 # --- Wczytywanie plików ---
 
-def convert_doc_to_docx(doc_path: Path) -> Path:
-    output_dir = doc_path.parent
+def convert_docs_to_docx(doc_paths: List[Path], output_dir: Path, batch_size: int = 200) -> dict:
+    """Convert .doc files to .docx with as few soffice runs as possible.
+
+    Every batch gets its own subdirectory of output_dir, and files sharing a
+    stem go to different batches so their outputs cannot collide. Returns a
+    mapping from each source path to its converted .docx.
+    """
+    batches = []
+    for doc_path in doc_paths:
+        for batch in batches:
+            if len(batch) < batch_size and all(p.stem != doc_path.stem for p in batch):
+                batch.append(doc_path)
+                break
+        else:
+            batches.append([doc_path])
+
+    converted = {}
+    for k, batch in enumerate(batches):
+        batch_dir = output_dir / f"batch_{k}"
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            subprocess.run([
+                "soffice",
+                "--headless",
+                "--convert-to", "docx",
+                "--outdir", str(batch_dir),
+                *(str(p) for p in batch)
+            ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            console.print(f"Błąd konwersji ({len(batch)} plików .doc): {e}")
+        for doc_path in batch:
+            docx_path = batch_dir / (doc_path.stem + ".docx")
+            if docx_path.exists():
+                converted[doc_path] = docx_path
+            else:
+                console.print(f"Błąd konwersji {doc_path.name}")
+    return converted
+
+def convert_doc_to_docx(doc_path: Path, output_dir: Path = None) -> Path:
+    output_dir = output_dir or doc_path.parent
     try:
         subprocess.run([
             "soffice",
@@ -96,187 +148,860 @@ def convert_doc_to_docx(doc_path: Path) -> Path:
         console.print(f"Błąd konwersji {doc_path.name}: {e}")
         return None
 
-def load_docx(path: Path) -> str:
+# Each iter_* loader yields pieces of a document's text that concatenate to
+# the full text, so documents can be chunked without holding them whole.
+
+def iter_docx(path: Path) -> Iterator[str]:
     try:
         doc = Document(path)
-        return "\n".join(p.text.strip() for p in doc.paragraphs if p.text.strip())
+        separator = ""
+        for p in doc.paragraphs:
+            if p.text.strip():
+                yield separator + p.text.strip()
+                separator = "\n"
     except Exception as e:
         console.print(f"Ostrzeżenie: Nie udało się odczytać .docx {path.name}: {e}")
-        return ""
 
-def load_doc(path: Path) -> str:
-    docx_path = convert_doc_to_docx(path)
-    if docx_path and docx_path.exists():
-        return load_docx(docx_path)
-    else:
-        return ""
+def iter_doc(path: Path) -> Iterator[str]:
+    # Convert into a temporary directory rather than next to the source file.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        docx_path = convert_doc_to_docx(path, Path(tmp_dir))
+        if docx_path and docx_path.exists():
+            yield from iter_docx(docx_path)
 
-def load_pdf(path: Path) -> str:
-    text_content = []
+def iter_pdf(path: Path) -> Iterator[str]:
     try:
         with open(path, 'rb') as f:
             reader = PyPDF2.PdfReader(f)
+            separator = ""
             for page in reader.pages:
                 text = page.extract_text()
                 if text:
-                    text_content.append(text.strip())
-        return "\n".join(text_content)
+                    yield separator + text.strip()
+                    separator = "\n"
     except Exception as e:
         console.print(f"Ostrzeżenie: Nie udało się odczytać .pdf {path.name}: {e}")
-        return ""
 
-def load_text(path: Path) -> str:
+def iter_text(path: Path, block_size: int = 1024 * 1024) -> Iterator[str]:
     try:
-        return path.read_text(encoding='utf-8')
+        with open(path, "r", encoding="utf-8") as f:
+            for block in iter(lambda: f.read(block_size), ""):
+                yield block
     except Exception as e:
         console.print(f"Ostrzeżenie: Nie udało się odczytać {path.name}: {e}")
-        return ""
 
-def process_folder(folder_path: str) -> str:
+def load_docx(path: Path) -> str:
+    return "".join(iter_docx(path))
+
+def load_doc(path: Path) -> str:
+    return "".join(iter_doc(path))
+
+def load_pdf(path: Path) -> str:
+    return "".join(iter_pdf(path))
+
+def load_text(path: Path) -> str:
+    return "".join(iter_text(path))
+
+SUPPORTED_LOADERS = {
+    ".docx": load_docx,
+    ".doc": load_doc,
+    ".pdf": load_pdf,
+    ".txt": load_text,
+    ".md": load_text
+}
+
+STREAMING_LOADERS = {
+    ".docx": iter_docx,
+    ".doc": iter_doc,
+    ".pdf": iter_pdf,
+    ".txt": iter_text,
+    ".md": iter_text
+}
+
+DOCUMENT_SEPARATOR = "\n\n---\n\n"
+
+def list_supported_files(folder_path: str) -> List[Path]:
     base_path = Path(folder_path)
     if not base_path.is_dir():
         raise FileNotFoundError(f"Ścieżka '{folder_path}' nie jest folderem.")
-    
-    supported = {
-        ".docx": load_docx,
-        ".doc": load_doc,
-        ".pdf": load_pdf,
-        ".txt": load_text,
-        ".md": load_text
-    }
 
-    all_files = [p for p in base_path.rglob("*") if p.is_file()]
-    supported_files = [p for p in all_files if p.suffix.lower() in supported]
+    all_files = sorted(p for p in base_path.rglob("*") if p.is_file())
+    return [p for p in all_files if p.suffix.lower() in SUPPORTED_LOADERS]
+
+PDF_PAGES_PER_TASK = 25
+
+def parse_task(task) -> List[str]:
+    """Parse one unit of work in a worker process and return its pieces.
+
+    A task is (kind, source, first_page, last_page); page bounds are only
+    used for PDFs, which are split into page ranges. The pieces are the
+    paragraphs or pages the streaming loaders yield, so chunking along their
+    boundaries does not depend on the number of workers.
+    """
+    kind, source, first_page, last_page = task
+    path = Path(source)
+    if kind == "pdf":
+        try:
+            with open(path, 'rb') as f:
+                reader = PyPDF2.PdfReader(f)
+                pages = [page.extract_text() for page in reader.pages[first_page:last_page]]
+                return [("\n" if k else "") + text.strip() for k, text in enumerate(t for t in pages if t)]
+        except Exception as e:
+            console.print(f"Ostrzeżenie: Nie udało się odczytać .pdf {path.name}: {e}")
+            return []
+    if kind == "docx":
+        return list(iter_docx(path))
+    return list(iter_text(path))
+
+def plan_parse_tasks(files: List[Path], converted: dict, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """Return (file, task) pairs in document order, splitting large PDFs by page range."""
+    tasks = []
+    for path in files:
+        suffix = path.suffix.lower()
+        if suffix == ".doc":
+            if path in converted:
+                tasks.append((path, ("docx", str(converted[path]), 0, 0)))
+        elif suffix == ".docx":
+            tasks.append((path, ("docx", str(path), 0, 0)))
+        elif suffix == ".pdf":
+            try:
+                with open(path, 'rb') as f:
+                    page_count = len(PyPDF2.PdfReader(f).pages)
+            except Exception:
+                page_count = 0
+            # Unreadable PDFs still get one task so the worker reports the error.
+            for first_page in range(0, max(page_count, 1), pages_per_task):
+                tasks.append((path, ("pdf", str(path), first_page, first_page + pages_per_task)))
+        else:
+            tasks.append((path, ("text", str(path), 0, 0)))
+    return tasks
+
+def iter_document_pieces(files: List[Path], parse_workers: int = 1, max_in_flight: int = 0):
+    """Yield (file, piece) pairs in file order; a file's pieces concatenate to its text.
+
+    All .doc files are converted up front by batched soffice runs into a
+    temporary directory. With parse_workers > 1 the files, and page ranges of
+    large PDFs, are parsed on a process pool with at most max_in_flight
+    tasks (default: twice parse_workers) running ahead of the consumer.
+    """
+    doc_files = [p for p in files if p.suffix.lower() == ".doc"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        converted = convert_docs_to_docx(doc_files, Path(tmp_dir)) if doc_files else {}
+
+        if parse_workers <= 1:
+            for path in files:
+                console.print(f"Przetwarzanie: {path.name}")
+                if path.suffix.lower() == ".doc":
+                    pieces = iter_docx(converted[path]) if path in converted else ()
+                else:
+                    pieces = STREAMING_LOADERS[path.suffix.lower()](path)
+                for piece in pieces:
+                    yield path, piece
+            return
+
+        started = set()
+
+        def finish(path, future):
+            for k, piece in enumerate(future.result()):
+                # Page ranges of one PDF are joined like its pages are.
+                yield path, ("\n" + piece if k == 0 and path in started else piece)
+                started.add(path)
+
+        max_in_flight = max(max_in_flight or 2 * parse_workers, parse_workers)
+        with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+            pending = deque()
+            announced = None
+            for path, task in plan_parse_tasks(files, converted):
+                if path != announced:
+                    console.print(f"Przetwarzanie: {path.name}")
+                    announced = path
+                if len(pending) >= max_in_flight:
+                    yield from finish(*pending.popleft())
+                pending.append((path, executor.submit(parse_task, task)))
+            while pending:
+                yield from finish(*pending.popleft())
+
+def iter_joined_text(document_pieces) -> Iterator[str]:
+    """Join (file, piece) pairs into one text stream with separators between documents."""
+    previous = None
+    for path, piece in document_pieces:
+        if not piece:
+            continue
+        if previous is not None and path != previous:
+            yield DOCUMENT_SEPARATOR
+        previous = path
+        yield piece
+
+def iter_folder_text(folder_path: str, parse_workers: int = 1) -> Iterator[str]:
+    """Yield the text of all documents in the folder piece by piece.
+
+    The pieces concatenate to exactly what process_folder() returns.
+    """
+    return iter_joined_text(iter_document_pieces(list_supported_files(folder_path), parse_workers))
+
+def load_documents(files: List[Path], parse_workers: int = 1) -> dict:
+    """Return the full text of each file, parsing them in parallel if requested."""
+    texts = {path: "" for path in files}
+    for path, piece in iter_document_pieces(files, parse_workers):
+        texts[path] += piece
+    return texts
+
+def process_folder(folder_path: str, parse_workers: int = 1) -> str:
+    return "".join(iter_folder_text(folder_path, parse_workers))
 
-    all_texts = []
-    for file_path in supported_files:
-        console.print(f"Przetwarzanie: {file_path.name}")
-        loader = supported.get(file_path.suffix.lower())
-        if loader:
-            content = loader(file_path)
-            if content:
-                all_texts.append(content)
+# --- Chunking i ekstrakcja ---
 
-    return "\n\n---\n\n".join(all_texts)
+def iter_chunks(pieces: Iterable[str], chunk_size: int, overlap_size: int = 0) -> Iterator[str]:
+    """Chunk a stream of text pieces, holding at most one chunk plus one piece.
 
-# --- Chunking i ekstrakcja ---
+    Produces the same chunks as chunk_text() on the concatenated pieces.
+    """
+    step = chunk_size - overlap_size
+    if step <= 0:
+        raise ValueError("overlap_size musi być mniejszy niż chunk_size.")
 
-def chunk_text(text: str, chunk_size: int, overlap_size: int = 0) -> List[str]:
-    chunks = []
+    buffer = ""
     start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap_size
-    return chunks
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) - start >= chunk_size:
+            yield buffer[start:start + chunk_size]
+            start += step
+        buffer = buffer[start:]
+        start = 0
+
+    while start < len(buffer):
+        yield buffer[start:start + chunk_size]
+        start += step
 
-def extract_meta_graph_from_chunk(text_chunk: str, delay: float = 0) -> MetaGraph:
-    prompt = LLM_PROMPT_TEMPLATE.format(text=text_chunk)
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=1000,
-            response_format={"type": "json_object"}
-        )
-        content = response.choices[0].message.content
-        parsed = json.loads(content)
-        if delay > 0:
-            time.sleep(delay)
-        return MetaGraph(**parsed)
-    except Exception as e:
+def chunk_text(text: str, chunk_size: int, overlap_size: int = 0) -> List[str]:
+    return list(iter_chunks([text], chunk_size, overlap_size))
+
+def chunk_document_pieces(
+    document_pieces,
+    chunk_size: int,
+    overlap_size: int = 0,
+    chunk_tokens: int = 0,
+    overlap_tokens: int = 0,
+) -> Iterator[str]:
+    """Chunk (file, piece) pairs by characters, or with chunk_tokens by model
+    tokens along document, heading, page and paragraph boundaries."""
+    if chunk_tokens:
+        units = iter_units(document_pieces, max_chars=CHARS_PER_TOKEN * chunk_tokens)
+        return iter_token_chunks(units, chunk_tokens, overlap_tokens, LLM_MODEL)
+    return iter_chunks(iter_joined_text(document_pieces), chunk_size, overlap_size)
+
+def iter_unique_chunks(chunks: Iterable[str], dedup_filter: NearDuplicateFilter, stats: dict) -> Iterator[str]:
+    """Drop chunks that are near-duplicates of an earlier one, counting the saved requests and tokens."""
+    for chunk in chunks:
+        if dedup_filter.is_duplicate(chunk):
+            stats["skipped"] += 1
+            stats["tokens"] += count_tokens(LLM_PROMPT_TEMPLATE.format(text=chunk), LLM_MODEL)
+            continue
+        yield chunk
+
+def extraction_cache_key(text_chunk: str) -> str:
+    """Cache key covering everything that determines an extraction result."""
+    return cache_key(LLM_PROMPT_TEMPLATE, text_chunk, LLM_MODEL, LLM_PARAMS)
+
+def extract_meta_graph_from_chunk(
+    text_chunk: str,
+    delay: float = 0,
+    limiter: RateLimiter = None,
+    max_retries: int = 5,
+    cache: ExtractionCache = None,
+    label: str = "",
+    failures: List[str] = None,
+) -> MetaGraph:
+    metrics = get_metrics()
+    key = None
+    if cache:
+        key = extraction_cache_key(text_chunk)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.count("cache_hits")
+            return MetaGraph(**cached)
+
+    def failed(e):
         console.print(f"Błąd LLM: {e}")
+        metrics.count("failed_chunks")
+        if cache:
+            cache.record_failure(key, label, str(e))
+        if failures is not None:
+            failures.append(label)
         return MetaGraph(concepts=[], relationships=[])
 
-def aggregate_meta_graphs(list_of_meta_graphs: List[MetaGraph]) -> MetaGraph:
-    unique_concepts = {}
-    unique_rels = {}
+    from openai import RateLimitError
 
-    for mg in list_of_meta_graphs:
-        for c in mg.concepts:
-            unique_concepts[slugify(c.id)] = c
-
-        for r in mg.relationships:
-            key = (slugify(r.source), slugify(r.target), slugify(r.type))
-            if key not in unique_rels:
-                unique_rels[key] = Relationship(source=r.source, target=r.target, type=r.type)
+    prompt = LLM_PROMPT_TEMPLATE.format(text=text_chunk)
+    attempt = 0
+    while True:
+        try:
+            if limiter:
+                with metrics.span("rate_limit_wait"):
+                    limiter.acquire(count_tokens(prompt, LLM_MODEL) + LLM_PARAMS["max_tokens"])
+            with metrics.llm_request("extract", LLM_MODEL, attempt) as request:
+                response = get_openai_client().with_options(max_retries=0).chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    **LLM_PARAMS
+                )
+                request.record(response)
+            content = response.choices[0].message.content
+            parsed = json.loads(content)
+            if delay > 0:
+                time.sleep(delay)
+            graph = MetaGraph(**parsed)
+            if cache:
+                cache.put(key, graph.model_dump(by_alias=True))
+            return graph
+        except Exception as e:
+            # The SDK's own retries are off, so transient errors are retried here with the same backoff.
+            if not is_transient_error(e) or attempt >= max_retries:
+                return failed(e)
+            wait = retry_after_seconds(e, attempt)
+            metrics.llm_retry("extract", LLM_MODEL)
+            if isinstance(e, RateLimitError):
+                console.print(f"Limit zapytań (429), ponowienie za {wait:.1f} s")
+            else:
+                console.print(f"Błąd przejściowy API ({type(e).__name__}), ponowienie za {wait:.1f} s")
+            if limiter and isinstance(e, RateLimitError):
+                limiter.pause(wait)
+            else:
+                with metrics.span("backoff"):
+                    time.sleep(wait)
+            attempt += 1
+
+def iter_meta_graphs(
+    chunks: Iterable[str],
+    concurrency: int = 1,
+    delay: float = 0,
+    limiter: RateLimiter = None,
+    cache: ExtractionCache = None,
+    failures: List[str] = None,
+    max_in_flight: int = 0,
+) -> Iterator[MetaGraph]:
+    """Yield the meta-graph of each chunk in chunk order as extractions finish.
+
+    With concurrency > 1 the chunks are sent from a thread pool and the
+    limiter, not a fixed delay, keeps the request rate within quota. At most
+    max_in_flight chunks (default: twice the concurrency) are pulled from
+    `chunks` ahead of the consumer, so a lazy chunk stream is never read
+    further than that.
+    """
+    total = f"/{len(chunks)}" if hasattr(chunks, "__len__") else ""
+
+    def extract(i, chunk):
+        console.print(f"🧠 Chunk {i+1}{total}")
+        return extract_meta_graph_from_chunk(
+            chunk, delay=delay, limiter=limiter, cache=cache, label=f"chunk {i+1}", failures=failures
+        )
 
-    final_concepts = list(unique_concepts.values())
-    final_rels = list(unique_rels.values())
+    if concurrency <= 1:
+        for i, chunk in enumerate(chunks):
+            yield extract(i, chunk)
+        return
 
-    return MetaGraph(concepts=final_concepts, relationships=final_rels)
+    max_in_flight = max(max_in_flight or 2 * concurrency, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for i, chunk in enumerate(chunks):
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(extract, i, chunk))
+        while pending:
+            yield pending.popleft().result()
+
+def extract_meta_graphs(
+    chunks: List[str],
+    concurrency: int = 1,
+    delay: float = 0,
+    limiter: RateLimiter = None,
+    cache: ExtractionCache = None,
+    failures: List[str] = None,
+) -> List[MetaGraph]:
+    """Extract meta-graphs for all chunks, returned in chunk order."""
+    return list(iter_meta_graphs(
+        chunks, concurrency=concurrency, delay=delay, limiter=limiter, cache=cache, failures=failures
+    ))
+
+def collect_meta_graphs(list_of_meta_graphs: Iterable[MetaGraph]) -> MetaGraphAggregator:
+    """Merge meta-graphs into an aggregator, slugifying each distinct name once."""
+    with get_metrics().span("aggregate"):
+        return MetaGraphAggregator.from_graphs(list_of_meta_graphs)
+
+def aggregate_meta_graphs(list_of_meta_graphs: Iterable[MetaGraph]) -> MetaGraph:
+    aggregator = collect_meta_graphs(list_of_meta_graphs)
+    return MetaGraph(concepts=list(aggregator.concepts.values()), relationships=list(aggregator.edges.values()))
+
+def save_meta_graph(
+    meta_data,
+    output_path: str,
+    base_uri: str = "http://example.org/ontology#",
+    output_format: str = None,
+    sort: bool = False,
+):
+    """Write a MetaGraph or MetaGraphAggregator as Turtle or N-Triples.
+
+    The format defaults to N-Triples for .nt files and Turtle otherwise.
+    Triples are written straight from the aggregator without building an
+    rdflib graph; sort=True gives output independent of the chunk order.
+    """
+    with get_metrics().span("serialize"):
+        if not isinstance(meta_data, MetaGraphAggregator):
+            meta_data = MetaGraphAggregator.from_graphs([meta_data])
+        count = write_ontology(meta_data, output_path, base_uri, output_format or guess_format(output_path), sort)
+    get_metrics().count("triples", count)
+    console.print(f"Ontologia zapisana jako {output_path}")
 
 def save_meta_graph_as_turtle(meta_data: MetaGraph, output_path: str, base_uri: str = "http://example.org/ontology#"):
-    g = Graph()
-    NS = Namespace(base_uri)
+    save_meta_graph(meta_data, output_path, base_uri, "turtle")
 
-    for concept in meta_data.concepts:
-        cid = slugify(concept.id, separator="_")
-        g.add((NS[cid], RDF.type, RDFS.Class))
+# --- Manifest dokumentów ---
 
-    for rel in meta_data.relationships:
-        src = slugify(rel.source, separator="_")
-        tgt = slugify(rel.target, separator="_")
-        prop = slugify(rel.type, separator="_")
+MANIFEST_VERSION = 1
 
-        g.add((NS[prop], RDF.type, RDF.Property))
-        g.add((NS[prop], RDFS.domain, NS[src]))
-        g.add((NS[prop], RDFS.range, NS[tgt]))
+def new_manifest(settings: dict) -> dict:
+    return {"version": MANIFEST_VERSION, "settings": settings, "files": {}}
 
-    g.serialize(destination=output_path, format="turtle")
-    console.print(f"Ontologia zapisana jako {output_path}")
+def load_manifest(manifest_path: str, settings: dict) -> dict:
+    """Load the document manifest, starting over if it was built with other settings."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return new_manifest(settings)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        console.print("Manifest zbudowany z innymi ustawieniami – wszystkie pliki zostaną przetworzone ponownie.")
+        return new_manifest(settings)
+    return manifest
+
+def save_manifest(manifest: dict, manifest_path: str):
+    write_json_atomic(manifest_path, manifest)
+
+def update_manifest(
+    folder_path: str,
+    manifest: dict,
+    chunk_size: int,
+    overlap_size: int,
+    extract,
+    parse_workers: int = 1,
+    chunk_tokens: int = 0,
+    overlap_tokens: int = 0,
+) -> dict:
+    """Re-extract only added or changed files and drop entries of deleted ones.
+
+    A file is unchanged when its size and mtime match the manifest, or failing
+    that, when its SHA-256 does. `extract(chunks, failures)` returns one
+    MetaGraph per chunk; files with failed chunks are left out so that the
+    next run retries them. Returns the counts of reused, extracted and removed files.
+    """
+    base_path = Path(folder_path)
+    files = manifest["files"]
+    current = {}
+    stats = {"reused": 0, "extracted": 0, "removed": 0}
+
+    changed = []
+    for file_path in list_supported_files(folder_path):
+        rel_path = file_path.relative_to(base_path).as_posix()
+        stat = file_path.stat()
+        entry = files.get(rel_path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            current[rel_path] = entry
+            stats["reused"] += 1
+            continue
+
+        digest = file_sha256(file_path)
+        if entry and entry["sha256"] == digest:
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            current[rel_path] = entry
+            stats["reused"] += 1
+            continue
+
+        current[rel_path] = None
+        changed.append((rel_path, file_path, stat, digest))
+
+    metrics = get_metrics()
+    with metrics.span("parse"):
+        texts = load_documents([file_path for _, file_path, _, _ in changed], parse_workers)
+    metrics.count("documents", len(changed))
+    for rel_path, file_path, stat, digest in changed:
+        text = texts[file_path]
+        failures = []
+        chunks = list(metrics.timed_iter("chunk", chunk_document_pieces(
+            [(file_path, text)], chunk_size, overlap_size, chunk_tokens, overlap_tokens
+        )))
+        metrics.count("chunks", len(chunks))
+        graphs = extract(chunks, failures) if text.strip() else []
+        if failures:
+            console.print(f"⚠️ {file_path.name}: {len(failures)} chunków zakończyło się błędem ({', '.join(failures)}); plik zostanie przetworzony ponownie.")
+            del current[rel_path]
+            continue
+
+        current[rel_path] = {
+            "sha256": digest,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "graph": aggregate_meta_graphs(graphs).model_dump(by_alias=True),
+        }
+        stats["extracted"] += 1
+
+    stats["removed"] = len(set(files) - set(current))
+    manifest["files"] = current
+    return stats
+
+# --- Tryb wsadowy (Batch API) ---
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+def batch_custom_id(index: int) -> str:
+    return f"chunk-{index:06d}"
+
+def build_batch_request(custom_id: str, text_chunk: str) -> dict:
+    """Return one Batch API request line for a chunk, identical to the interactive call."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": LLM_MODEL,
+            "messages": [{"role": "user", "content": LLM_PROMPT_TEMPLATE.format(text=text_chunk)}],
+            **LLM_PARAMS,
+        },
+    }
+
+def write_batch_requests(chunks: Iterable[str], batch_path: str) -> int:
+    """Write one Batch API request per chunk to a JSONL file and return their count."""
+    count = 0
+    with open(batch_path, "w", encoding="utf-8") as f:
+        for i, chunk in enumerate(chunks):
+            f.write(json.dumps(build_batch_request(batch_custom_id(i + 1), chunk), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def meta_graph_from_batch_result(result: dict) -> MetaGraph:
+    """Validate one Batch API result line into a MetaGraph, raising ValueError on failure."""
+    if result.get("error"):
+        raise ValueError(f"błąd zadania: {result['error']}")
+    response = result.get("response") or {}
+    if not isinstance(response, dict):
+        raise ValueError("niepoprawna odpowiedź: pole response nie jest obiektem")
+    if response.get("status_code") != 200:
+        raise ValueError(f"status HTTP {response.get('status_code')}")
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+        return MetaGraph(**json.loads(content))
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(f"niepoprawna odpowiedź: {e}")
+
+def read_batch_results(results_paths: List[str], requests_path: str = None):
+    """Read one or more Batch API results files, e.g. a run and its retry.
+
+    Returns (graphs, failed, missing): meta-graphs of the successful lines in
+    custom_id order, a dict of custom_id -> error for failed lines, and the
+    custom_ids of requests_path that have no result line at all.
+    """
+    graphs = {}
+    failed = {}
+    for results_path in results_paths:
+        with open(results_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError as e:
+                    failed[f"{results_path}:{line_number}"] = f"niepoprawny JSON: {e}"
+                    continue
+                if not isinstance(result, dict):
+                    failed[f"{results_path}:{line_number}"] = "wiersz nie jest obiektem JSON"
+                    continue
+                custom_id = result.get("custom_id") or f"{results_path}:{line_number}"
+                try:
+                    graphs[custom_id] = meta_graph_from_batch_result(result)
+                    failed.pop(custom_id, None)
+                except ValueError as e:
+                    if custom_id not in graphs:
+                        failed[custom_id] = str(e)
+
+    missing = []
+    if requests_path:
+        with open(requests_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    custom_id = json.loads(line)["custom_id"]
+                    if custom_id not in graphs and custom_id not in failed:
+                        missing.append(custom_id)
+
+    return [graphs[k] for k in sorted(graphs)], failed, missing
+
+def write_retry_batch(requests_path: str, custom_ids, retry_path: str) -> int:
+    """Copy the requests with the given custom_ids into a new batch file."""
+    wanted = set(custom_ids)
+    count = 0
+    with open(requests_path, "r", encoding="utf-8") as src, open(retry_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if line.strip() and json.loads(line)["custom_id"] in wanted:
+                dst.write(line if line.endswith("\n") else line + "\n")
+                count += 1
+    return count
+
+def generate_ontology_from_batch_results(
+    results_paths: List[str],
+    output_path: str,
+    requests_path: str = None,
+    retry_path: str = None,
+    output_format: str = None,
+    sort_output: bool = False,
+):
+    """Second phase of batch mode: validate results, aggregate and save the ontology."""
+    with get_metrics().span("read_batch_results"):
+        graphs, failed, missing = read_batch_results(results_paths, requests_path)
+    console.print(f"📥 Wyniki wsadowe: {len(graphs)} poprawnych, {len(failed)} błędnych, {len(missing)} brakujących.")
+    for custom_id, error in sorted(failed.items()):
+        console.print(f"Błąd {custom_id}: {error}")
+
+    if retry_path and (failed or missing):
+        if not requests_path:
+            raise ValueError("Do zapisania zadań do ponowienia potrzebny jest plik zadań (--batch_requests).")
+        count = write_retry_batch(requests_path, list(failed) + missing, retry_path)
+        console.print(f"🔁 Zapisano {count} zadań do ponowienia w {retry_path}")
+
+    final_graph = collect_meta_graphs(graphs)
+    console.print(f"✅ Finalna liczba pojęć: {len(final_graph.concepts)}, relacji: {len(final_graph.edges)}")
+    save_meta_graph(final_graph, output_path, output_format=output_format, sort=sort_output)
 
 # --- Główna funkcja ---
 
-def main(input_path: str, output_path: str, chunk_size: int, overlap_size: int, delay_between_chunks: float):
+def generate_ontology(
+    input_path: str,
+    output_path: str,
+    chunk_size: int,
+    overlap_size: int,
+    delay_between_chunks: float,
+    concurrency: int = 1,
+    requests_per_minute: float = 0,
+    tokens_per_minute: float = 0,
+    cache_path: str = None,
+    cache_size_mb: float = 1024,
+    manifest_path: str = None,
+    max_in_flight: int = 0,
+    parse_workers: int = 1,
+    dedup_threshold: float = 0,
+    chunk_tokens: int = 0,
+    overlap_tokens: int = 0,
+    batch_requests_path: str = None,
+    output_format: str = None,
+    sort_output: bool = False,
+):
     console.print(f"📁 Przetwarzany folder: {input_path}")
-    text = process_folder(input_path)
-
-    if not text.strip():
-        console.print("❌ Brak danych tekstowych do przetworzenia.")
-        save_meta_graph_as_turtle(MetaGraph(concepts=[], relationships=[]), output_path)
-        return
-
-    chunks = chunk_text(text, chunk_size, overlap_size)
-    console.print(f"🔎 Podzielono tekst na {len(chunks)} chunków.")
+    if manifest_path and batch_requests_path:
+        raise ValueError("Tryb wsadowy nie obsługuje manifestu (--manifest).")
+    if chunk_tokens and is_estimated(LLM_MODEL):
+        console.print("⚠️ Brak pakietu tiktoken – liczba tokenów dla --chunk_tokens jest szacowana (ok. 4 znaki na token).")
+
+    limiter = None
+    if requests_per_minute or tokens_per_minute:
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    # The fixed delay is only a fallback for sequential runs without a limiter.
+    delay = delay_between_chunks if limiter is None and concurrency <= 1 else 0
+    cache = ExtractionCache(cache_path, int(cache_size_mb * 1024 * 1024)) if cache_path else None
+
+    dedup_filter = NearDuplicateFilter(dedup_threshold) if dedup_threshold else None
+    dedup_stats = {"skipped": 0, "tokens": 0}
+    metrics = get_metrics()
+
+    def unique(chunks, dedup_filter=dedup_filter):
+        if not dedup_filter:
+            return chunks
+        return metrics.timed_iter("dedup", iter_unique_chunks(chunks, dedup_filter, dedup_stats))
+
+    def extract(chunks, failures):
+        # The manifest keeps one graph per file, so a file's chunks are only
+        # checked against each other: a chunk dropped as a copy of another
+        # file's would vanish from the ontology when that file changes.
+        file_filter = NearDuplicateFilter(dedup_threshold) if dedup_threshold else None
+        return extract_meta_graphs(
+            list(unique(chunks, file_filter)), concurrency=concurrency, delay=delay, limiter=limiter, cache=cache, failures=failures
+        )
 
-    all_graphs = []
-    for i, chunk in enumerate(chunks):
-        console.print(f"🧠 Chunk {i+1}/{len(chunks)}")
-        graph = extract_meta_graph_from_chunk(chunk, delay=delay_between_chunks)
-        all_graphs.append(graph)
+    try:
+        if manifest_path:
+            settings = {
+                "chunk_size": chunk_size,
+                "overlap_size": overlap_size,
+                "chunk_tokens": chunk_tokens,
+                "overlap_tokens": overlap_tokens,
+                "dedup_threshold": dedup_threshold,
+                "extraction": cache_key(LLM_PROMPT_TEMPLATE, LLM_MODEL, LLM_PARAMS),
+            }
+            with metrics.span("manifest"):
+                manifest = load_manifest(manifest_path, settings)
+            stats = update_manifest(
+                input_path, manifest, chunk_size, overlap_size, extract, parse_workers, chunk_tokens, overlap_tokens
+            )
+            with metrics.span("manifest"):
+                save_manifest(manifest, manifest_path)
+            console.print(
+                f"🔎 Pliki: {stats['reused']} bez zmian, {stats['extracted']} przetworzonych, {stats['removed']} usuniętych."
+            )
+            all_graphs = (MetaGraph(**entry["graph"]) for entry in manifest["files"].values())
+            final_graph = collect_meta_graphs(all_graphs)
+        else:
+            # Documents, chunks and extractions flow through generators, so only
+            # the in-flight window and the aggregated graph are held in memory.
+            chunk_count = 0
+
+            def counted(chunks):
+                nonlocal chunk_count
+                for chunk in chunks:
+                    chunk_count += 1
+                    yield chunk
+
+            failures = []
+            files = list_supported_files(input_path)
+            metrics.count("documents", len(files))
+            # Each stage is timed as its consumer pulls from it, so the spans
+            # separate parsing, chunking, waiting for extractions and aggregation.
+            document_pieces = metrics.timed_iter("parse", iter_document_pieces(files, parse_workers))
+            chunks = counted(metrics.timed_iter("chunk", chunk_document_pieces(
+                document_pieces, chunk_size, overlap_size, chunk_tokens, overlap_tokens
+            )))
+
+            if batch_requests_path:
+                with metrics.span("write_batch_requests"):
+                    count = write_batch_requests(unique(chunks), batch_requests_path)
+                metrics.count("chunks", chunk_count)
+                console.print(f"📤 Zapisano {count} zadań wsadowych w {batch_requests_path}")
+                return
+            final_graph = collect_meta_graphs(metrics.timed_iter("extract", iter_meta_graphs(
+                unique(chunks),
+                concurrency=concurrency,
+                delay=delay,
+                limiter=limiter,
+                cache=cache,
+                failures=failures,
+                max_in_flight=max_in_flight,
+            )))
+            metrics.count("chunks", chunk_count)
+
+            if not chunk_count:
+                console.print("❌ Brak danych tekstowych do przetworzenia.")
+            else:
+                console.print(f"🔎 Przetworzono {chunk_count} chunków.")
+            if failures:
+                console.print(f"⚠️ {len(failures)} chunków zakończyło się błędem: {', '.join(failures)}")
+                console.print("   Ponowne uruchomienie z --cache spróbuje je powtórzyć; --list_failures pokaże zapisane błędy.")
+    finally:
+        if cache:
+            cache.close()
+
+    if dedup_filter:
+        metrics.count("skipped_chunks", dedup_stats["skipped"])
+        console.print(
+            f"♻️ Pominięto {dedup_stats['skipped']} prawie identycznych chunków "
+            f"(oszczędność: {dedup_stats['skipped']} zapytań, ~{dedup_stats['tokens']} tokenów wejściowych)."
+        )
+    console.print(f"✅ Finalna liczba pojęć: {len(final_graph.concepts)}, relacji: {len(final_graph.edges)}")
+    save_meta_graph(final_graph, output_path, output_format=output_format, sort=sort_output)
 
-    final_graph = aggregate_meta_graphs(all_graphs)
-    console.print(f"✅ Finalna liczba pojęć: {len(final_graph.concepts)}, relacji: {len(final_graph.relationships)}")
-    save_meta_graph_as_turtle(final_graph, output_path)
+def print_cached_failures(cache_path: str) -> int:
+    """Print the extractions still marked as failed in a cache and return their count."""
+    cache = ExtractionCache(cache_path)
+    try:
+        failures = cache.failures()
+    finally:
+        cache.close()
+    if not failures:
+        console.print("✅ Brak nieudanych ekstrakcji w cache.")
+        return 0
+    table = Table(title=f"Nieudane ekstrakcje ({len(failures)})", show_lines=True)
+    table.add_column("Klucz", style="cyan", no_wrap=True)
+    table.add_column("Chunk", style="cyan")
+    table.add_column("Błąd", style="red", overflow="fold")
+    for key, label, error in failures:
+        table.add_row(key[:12], label or "", error or "")
+    console.print(table)
+    return len(failures)
 
 # --- CLI ---
 
-import argparse
-from .core import generate_ontology  # lub z odpowiedniego modułu
-
 def main(args=None):
     parser = argparse.ArgumentParser(
         description="Generate RDF ontology from documents in a folder."
     )
-    parser.add_argument("input", help="Path to folder with documents (.doc, .docx, .pdf, .txt, .md)")
+    parser.add_argument("input", nargs="?", help="Path to folder with documents (.doc, .docx, .pdf, .txt, .md); not needed with --batch_results")
     parser.add_argument("--output", default="ontology.ttl", help="Output TTL file")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="Output format: grouped Turtle or N-Triples (default: nt for .nt files, otherwise turtle)")
+    parser.add_argument("--sorted", action="store_true", help="Sort the output triples so it does not depend on chunk order")
     parser.add_argument("--chunk_size", type=int, default=4000, help="Chunk size (characters)")
     parser.add_argument("--overlap_size", type=int, default=500, help="Overlap between chunks (characters)")
-    parser.add_argument("--delay_between_chunks", type=float, default=2.0, help="Delay between chunks (seconds)")
+    parser.add_argument("--chunk_tokens", type=int, default=0, help="Chunk size in model tokens, packed along paragraph, heading and page boundaries (0 = use --chunk_size)")
+    parser.add_argument("--overlap_tokens", type=int, default=0, help="Overlap between token-based chunks (tokens)")
+    parser.add_argument("--delay_between_chunks", type=float, default=2.0, help="Delay between chunks (seconds), used only for sequential runs without rate limits")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of chunks extracted concurrently")
+    parser.add_argument("--rpm", type=float, default=0, help="Requests-per-minute limit (0 = unlimited)")
+    parser.add_argument("--tpm", type=float, default=0, help="Tokens-per-minute limit (0 = unlimited)")
+    parser.add_argument("--cache", default=None, help="SQLite file caching chunk extractions, so reruns resume where they stopped")
+    parser.add_argument("--cache_size_mb", type=float, default=1024, help="Maximum cache size in MB before LRU eviction")
+    parser.add_argument("--list_failures", action="store_true", help="List the chunk extractions recorded as failed in --cache and exit")
+    parser.add_argument("--max_in_flight", type=int, default=0, help="Maximum chunks read ahead of extraction (default: twice --concurrency)")
+    parser.add_argument("--parse-workers", type=int, default=1, help="Number of processes used to parse documents")
+    parser.add_argument("--dedup_threshold", type=float, default=0, help="Skip chunks whose estimated Jaccard similarity to an earlier chunk reaches this value (0 = off); with --manifest, only within each file")
+    parser.add_argument("--manifest", default=None, help="JSON manifest of per-file meta-graphs; only added or changed files are re-extracted")
+    parser.add_argument("--batch_requests", default=None, help="Batch mode, phase one: write chunk requests to this JSONL file instead of calling the API")
+    parser.add_argument("--batch_results", nargs="+", default=None, help="Batch mode, phase two: build the ontology from these Batch API results JSONL files")
+    parser.add_argument("--batch_retry", default=None, help="Batch mode, phase two: write failed and missing requests to this JSONL file (requires --batch_requests)")
+    add_metrics_arguments(parser)
 
     parsed_args = parser.parse_args(args)
+    if parsed_args.list_failures:
+        if not parsed_args.cache:
+            parser.error("--list_failures requires --cache")
+        print_cached_failures(parsed_args.cache)
+        return
+    if not parsed_args.input and not parsed_args.batch_results:
+        parser.error("input is required unless --batch_results is given")
 
     try:
-        generate_ontology(
-            parsed_args.input,
-            parsed_args.output,
-            parsed_args.chunk_size,
-            parsed_args.overlap_size,
-            parsed_args.delay_between_chunks,
-        )
-        print("Ontology successfully generated.")
+        with instrumented("generate-ontology", parsed_args):
+            if parsed_args.batch_results:
+                generate_ontology_from_batch_results(
+                    parsed_args.batch_results,
+                    parsed_args.output,
+                    requests_path=parsed_args.batch_requests,
+                    retry_path=parsed_args.batch_retry,
+                    output_format=parsed_args.format,
+                    sort_output=parsed_args.sorted,
+                )
+                print("Ontology successfully generated.")
+                return
+
+            generate_ontology(
+                parsed_args.input,
+                parsed_args.output,
+                parsed_args.chunk_size,
+                parsed_args.overlap_size,
+                parsed_args.delay_between_chunks,
+                concurrency=parsed_args.concurrency,
+                requests_per_minute=parsed_args.rpm,
+                tokens_per_minute=parsed_args.tpm,
+                cache_path=parsed_args.cache,
+                cache_size_mb=parsed_args.cache_size_mb,
+                manifest_path=parsed_args.manifest,
+                max_in_flight=parsed_args.max_in_flight,
+                parse_workers=parsed_args.parse_workers,
+                dedup_threshold=parsed_args.dedup_threshold,
+                chunk_tokens=parsed_args.chunk_tokens,
+                overlap_tokens=parsed_args.overlap_tokens,
+                batch_requests_path=parsed_args.batch_requests,
+                output_format=parsed_args.format,
+                sort_output=parsed_args.sorted,
+            )
+            if parsed_args.batch_requests:
+                print("Batch requests successfully written.")
+            else:
+                print("Ontology successfully generated.")
     except Exception as e:
         print(f"Critical error: {e}")
 
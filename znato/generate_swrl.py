@@ -1,31 +1,30 @@
-import os
+import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from rdflib import Graph
-from openai import OpenAI
 from docx import Document
 
+from .chunking import count_tokens, iter_token_chunks
+from .extraction_cache import cache_key
+from .fileutil import write_json_atomic
+from .llm_client import get_openai_client
+from .metrics import add_metrics_arguments, get_metrics, instrumented
+from .ontology_index import load_ontology_index
+from .prompt_retrieval import BM25, tokenize
+from .swrl_rules import normalize_rules
+
 # Load environment variables from .env file
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Brakuje klucza OPENAI_API_KEY w pliku .env")
-
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+SECTION_TOKENS = 3000
+MAX_SECTION_CLASSES = 300
 
 def load_ontology_classes(ttl_path):
-    g = Graph()
-    g.parse(ttl_path, format="ttl")
-    classes = set()
-    for s, p, o in g.triples((None, None, None)):
-        if str(p).endswith("type") and str(o).endswith("Class"):
-            classes.add(str(s).split('#')[-1])
-    return classes
+    return load_ontology_index(ttl_path).class_names()
 
-def generate_swrl_rules(description, ontology_classes):
-    prompt = f"""
-Given the following ontology classes: {', '.join(ontology_classes)}
+SWRL_MODEL = "gpt-4o-mini"
+SWRL_PROMPT_TEMPLATE = """
+Given the following ontology classes: {classes}
 
 And the system description text:
 \"\"\"
@@ -41,14 +40,19 @@ Return only SWRL rules in the following format:
 Each rule must be numbered on a separate line using Arabic numerals (1., 2., ...).
 Do not include any explanations, just the rules.
 """
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a precise semantic web expert."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0
-    )
+
+def generate_swrl_rules(description, ontology_classes):
+    prompt = SWRL_PROMPT_TEMPLATE.format(classes=", ".join(ontology_classes), description=description)
+    with get_metrics().llm_request("swrl", SWRL_MODEL) as request:
+        response = get_openai_client().chat.completions.create(
+            model=SWRL_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a precise semantic web expert."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0
+        )
+        request.record(response)
     return response.choices[0].message.content.strip()
 
 
@@ -57,30 +61,200 @@ def read_docx(file_path):
     paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
     return "\n".join(paragraphs)
 
+def read_docx_sections(file_path):
+    """Split a DOCX file into sections at paragraphs styled as headings or a title.
+
+    Each section is a list of paragraphs starting with its heading; text
+    before the first heading forms a section of its own.
+    """
+    doc = Document(file_path)
+    sections = []
+    current = []
+    for p in doc.paragraphs:
+        text = p.text.strip()
+        if not text:
+            continue
+        style = p.style.name if p.style is not None else ""
+        if style.startswith(("Heading", "Title")) and current:
+            sections.append(current)
+            current = []
+        current.append(text)
+    if current:
+        sections.append(current)
+    return sections
+
+def split_sections(sections, max_tokens=SECTION_TOKENS):
+    """Join each section's paragraphs, splitting sections longer than max_tokens.
+
+    Long sections are split at paragraph boundaries and every part starts
+    with the section's heading, so each request keeps its context.
+    """
+    texts = []
+    for paragraphs in sections:
+        text = "\n".join(paragraphs)
+        if count_tokens(text) <= max_tokens or len(paragraphs) == 1:
+            texts.append(text)
+            continue
+        heading, body = paragraphs[0], paragraphs[1:]
+        budget = max(max_tokens - count_tokens(heading), 1)
+        for chunk in iter_token_chunks([(p, "block") for p in body], budget):
+            texts.append(heading + "\n" + chunk.replace("\n\n", "\n"))
+    return texts
+
+class ClassSelector:
+    """Pick the ontology classes relevant to a piece of text with BM25 over class names."""
+
+    def __init__(self, ontology_classes, limit=MAX_SECTION_CLASSES):
+        self.classes = sorted(ontology_classes)
+        self.limit = limit
+        self.index = BM25(tokenize(c) for c in self.classes) if len(self.classes) > limit else None
+
+    def select(self, text):
+        """Return `limit` classes, best-matching first, in alphabetical order.
+
+        Ontologies with at most `limit` classes are passed through unchanged.
+        When fewer classes match the text, for instance prose in another
+        language than the class names, the rest are filled up in
+        alphabetical order, so a section is never sent with too few classes.
+        """
+        if self.index is None:
+            return self.classes
+        scores = self.index.scores(tokenize(text))
+        ranked = sorted((k for k in scores if scores[k] > 0), key=lambda k: (-scores[k], self.classes[k]))[:self.limit]
+        if len(ranked) < self.limit:
+            matched = set(ranked)
+            ranked.extend(k for k in range(len(self.classes)) if k not in matched)
+            ranked = ranked[:self.limit]
+        return sorted(self.classes[k] for k in ranked)
+
+# --- Section manifest ---
+
+MANIFEST_VERSION = 1
+
+def manifest_settings() -> dict:
+    return {"model": SWRL_MODEL, "prompt": cache_key(SWRL_PROMPT_TEMPLATE)}
+
+def section_key(text, classes) -> str:
+    return cache_key(text, sorted(classes))
+
+def load_manifest(manifest_path) -> dict:
+    """Load the section manifest, starting over if it was built with another model or prompt."""
+    settings = manifest_settings()
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"version": MANIFEST_VERSION, "settings": settings, "sections": {}}
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings") != settings:
+        print("Manifest was built with another model or prompt; regenerating all sections.")
+        return {"version": MANIFEST_VERSION, "settings": settings, "sections": {}}
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    write_json_atomic(manifest_path, manifest)
+
+def generate_section_rules(sections, ontology_classes, concurrency=4, max_classes=MAX_SECTION_CLASSES, manifest=None):
+    """Generate rules for every section concurrently.
+
+    Returns the canonical rules of each section in section order, so the
+    result does not depend on which request finishes first, the numbers of
+    sections whose request failed and the number of sections reused.
+
+    With a manifest, sections whose text and class subset are unchanged
+    reuse their stored rules. Afterwards the manifest holds exactly the
+    current sections that succeeded, so failed ones are retried next time.
+    """
+    selector = ClassSelector(ontology_classes, max_classes)
+    stored = manifest["sections"] if manifest is not None else {}
+    metrics = get_metrics()
+
+    def generate(text, classes):
+        rules = generate_swrl_rules(text, classes)
+        with metrics.span("normalize"):
+            return normalize_rules(rules.splitlines())
+
+    results = [[] for _ in sections]
+    keys = []
+    failed = []
+    reused = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {}
+        for k, text in enumerate(sections):
+            with metrics.span("select_classes"):
+                classes = selector.select(text)
+            key = section_key(text, classes)
+            keys.append(key)
+            if key in stored:
+                results[k] = stored[key]
+                reused += 1
+                continue
+            print(f"Section {k + 1}/{len(sections)}: {count_tokens(text)} tokens, {len(classes)} classes")
+            futures[k] = executor.submit(generate, text, classes)
+        for k, future in futures.items():
+            try:
+                with metrics.span("generate"):
+                    results[k] = future.result()
+            except Exception as e:
+                print(f"Section {k + 1} failed: {e}")
+                failed.append(k + 1)
+
+    metrics.count("sections", len(sections))
+    metrics.count("reused_sections", reused)
+    metrics.count("failed_sections", len(failed))
+
+    if manifest is not None:
+        manifest["sections"] = {key: results[k] for k, key in enumerate(keys) if k + 1 not in failed}
+    return results, failed, reused
+
 def save_swrl_rules_numbered(rules_text, output_path):
-    lines = [line.strip() for line in rules_text.splitlines() if line.strip()]
+    """Write canonical, deduplicated rules numbered from 1."""
+    lines = normalize_rules(rules_text.splitlines())
     with open(output_path, "w", encoding="utf-8") as f:
         for i, line in enumerate(lines, 1):
-            f.write(f"{line}\n")
-
-import argparse
-from .swrl_utils import load_ontology_classes, read_docx, generate_swrl_rules, save_swrl_rules_numbered
+            f.write(f"{i}. {line}\n")
 
 def main(args=None):
     parser = argparse.ArgumentParser(description="Extract SWRL rules from system description and ontology")
     parser.add_argument("-o", "--ontology", required=True, help="Path to ontology TTL file")
     parser.add_argument("-d", "--description", required=True, help="Path to system description DOCX file")
+    parser.add_argument("--output", default="generated_rules.swrl", help="Output SWRL rules file")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sections generated in parallel")
+    parser.add_argument("--section_tokens", type=int, default=SECTION_TOKENS, help="Maximum tokens of description per request")
+    parser.add_argument("--max_classes", type=int, default=MAX_SECTION_CLASSES, help="Maximum ontology classes sent with each section")
+    parser.add_argument("--manifest", default=None, help="JSON manifest of per-section rules; only changed sections are regenerated")
+    add_metrics_arguments(parser)
 
     parsed_args = parser.parse_args(args)
+    with instrumented("generate-swrl", parsed_args) as metrics:
+        run_generate_swrl(parsed_args, metrics)
 
-    ontology_classes = load_ontology_classes(parsed_args.ontology)
-    description = read_docx(parsed_args.description)
-    swrl_rules = generate_swrl_rules(description, ontology_classes)
+def run_generate_swrl(parsed_args, metrics):
+    with metrics.span("load_ontology"):
+        ontology_classes = load_ontology_classes(parsed_args.ontology)
+    with metrics.span("read_description"):
+        sections = split_sections(read_docx_sections(parsed_args.description), parsed_args.section_tokens)
+    manifest = load_manifest(parsed_args.manifest) if parsed_args.manifest else None
+    section_rules, failed, reused = generate_section_rules(
+        sections,
+        ontology_classes,
+        concurrency=parsed_args.concurrency,
+        max_classes=parsed_args.max_classes,
+        manifest=manifest,
+    )
+    if manifest is not None:
+        save_manifest(manifest, parsed_args.manifest)
+        print(f"Sections: {reused} unchanged, {len(sections) - reused} generated.")
+    swrl_rules = "\n".join(rule for rules in section_rules for rule in rules)
 
-    output_file = "generated_rules.swrl"
-    save_swrl_rules_numbered(swrl_rules, output_file)
+    output_file = parsed_args.output
+    with metrics.span("write"):
+        save_swrl_rules_numbered(swrl_rules, output_file)
 
     print(f"SWRL rules saved to {output_file}")
+    if failed:
+        print(f"Rule generation failed for sections {', '.join(map(str, failed))}; their rules are missing from the output.")
+        if manifest is not None:
+            print("Rerun with the same --manifest to retry only those sections.")
     print("\nGenerated SWRL rules:\n")
-    print(swrl_rules)
-
+    with open(output_file, "r", encoding="utf-8") as f:
+        print(f.read())
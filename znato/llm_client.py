@@ -0,0 +1,68 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# openai is imported on first use, never at module level: importing it takes
+# a large share of a command's startup time. Modules that only need its
+# exception types import them inside the function that handles them.
+_client = None
+_lock = threading.Lock()
+
+# ZNATO_LLM_BACKEND selects what get_openai_client() returns:
+#   openai  - the OpenAI API (default)
+#   record  - the OpenAI API, appending every response to ZNATO_LLM_RECORDINGS
+#   replay  - an offline stand-in answering from ZNATO_LLM_RECORDINGS, if set,
+#             and synthesising the rest; ZNATO_LLM_LATENCY, ZNATO_LLM_JITTER,
+#             ZNATO_LLM_RATE_LIMIT and ZNATO_LLM_SEED tune its behaviour
+LLM_BACKENDS = ("openai", "record", "replay")
+DEFAULT_RECORDINGS = "llm_recordings.jsonl"
+
+def set_llm_client(client):
+    """Install `client` as the shared client and return the previous one (None to reset)."""
+    global _client
+    with _lock:
+        previous, _client = _client, client
+    return previous
+
+def _create_client():
+    from .llm_standin import RecordingClient, StandInClient
+
+    load_dotenv()
+    backend = os.getenv("ZNATO_LLM_BACKEND", "openai")
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Nieznany backend LLM '{backend}' (dostępne: {', '.join(LLM_BACKENDS)})")
+    recordings = os.getenv("ZNATO_LLM_RECORDINGS")
+
+    if backend == "replay":
+        options = dict(
+            latency=float(os.getenv("ZNATO_LLM_LATENCY", 0)),
+            jitter=float(os.getenv("ZNATO_LLM_JITTER", 0)),
+            rate_limit=float(os.getenv("ZNATO_LLM_RATE_LIMIT", 0)),
+            seed=int(os.getenv("ZNATO_LLM_SEED", 0)),
+        )
+        if recordings:
+            return StandInClient.from_recordings(recordings, **options)
+        return StandInClient(**options)
+
+    from openai import OpenAI
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("Brakuje klucza OPENAI_API_KEY w pliku .env")
+    client = OpenAI(api_key=api_key)
+    if backend == "record":
+        return RecordingClient(client, recordings or DEFAULT_RECORDINGS)
+    return client
+
+def get_openai_client():
+    """Return the shared LLM client, creating it on first use.
+
+    The openai package is imported and OPENAI_API_KEY is required only when
+    a command actually calls the API, so local commands start without them.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
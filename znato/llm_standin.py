@@ -0,0 +1,190 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+from types import SimpleNamespace
+
+from .chunking import count_tokens
+from .extraction_cache import cache_key
+
+def request_key(model, messages, params) -> str:
+    """Key identifying a chat completion request in a recordings file."""
+    return cache_key(model, messages, params)
+
+def load_recordings(path) -> dict:
+    """Read recorded responses (JSONL, one {"key", "content", "usage"} object per line)."""
+    recordings = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[record["key"]] = record
+    return recordings
+
+def make_response(content: str, prompt_tokens: int, completion_tokens: int):
+    """Build an object shaped like an OpenAI chat completion."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+# --- Synthetic responses ---
+
+_TEXT = re.compile(r'"""(.*)"""', re.S)
+_WORD = re.compile(r"[A-Za-z][a-z]{3,}")
+RELATION_TYPES = ("DEPENDS_ON", "PRODUCES", "PARTICIPATES_IN", "USES", "PART_OF", "MANAGES")
+
+def _stable_choice(options, *parts):
+    digest = hashlib.sha256(json.dumps(parts).encode("utf-8")).digest()
+    return options[digest[0] % len(options)]
+
+def _frequent_words(text: str, limit: int):
+    counts = Counter(word.capitalize() for word in _WORD.findall(text))
+    return [word for word, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+def synthesize_content(messages, params) -> str:
+    """Deterministic response to a request that has no recording.
+
+    JSON requests get a meta-graph of the most frequent words of the quoted
+    text, requests asking only for SWRL rules get rules over those words,
+    and anything else a short answer naming them.
+    """
+    prompt = messages[-1]["content"]
+    match = _TEXT.search(prompt)
+    words = _frequent_words(match.group(1) if match else prompt, 8)
+
+    if (params.get("response_format") or {}).get("type") == "json_object":
+        relationships = [
+            {"source": a, "target": b, "type": _stable_choice(RELATION_TYPES, a, b)}
+            for a, b in zip(words, words[1:])
+        ]
+        return json.dumps({"concepts": [{"id": w} for w in words], "relationships": relationships})
+
+    if "Return only SWRL rules" in prompt:
+        return "\n".join(
+            f"{k}. {a}(?x) ∧ has{b}(?x, ?y) → {b}(?y)"
+            for k, (a, b) in enumerate(zip(words, words[1:]), start=1)
+        )
+
+    return "Answer based on: " + ", ".join(words)
+
+# --- Clients ---
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+class StandInClient:
+    """Offline stand-in for the OpenAI client.
+
+    Requests are answered from recorded responses when their key is in
+    `recordings`, otherwise with synthesize_content(). Each call waits
+    `latency` seconds plus up to `jitter` more, and fails with a 429
+    RateLimitError with probability `rate_limit` (advertising `retry_after`
+    seconds). Delays and failures are drawn from a hash of the seed, the
+    request and how often it has been sent, so a run behaves the same
+    however its threads are scheduled.
+    """
+
+    def __init__(
+        self,
+        recordings: dict = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: float = 0.0,
+        seed: int = 0,
+    ):
+        self.recordings = recordings or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.seed = seed
+        self.chat = SimpleNamespace(completions=_Completions(self._create))
+        self._lock = threading.Lock()
+        self._attempts = Counter()
+        self.stats = Counter()
+        self.latencies = []
+
+    @classmethod
+    def from_recordings(cls, path, **options):
+        return cls(load_recordings(path), **options)
+
+    def with_options(self, **options):
+        return self
+
+    def _draw(self, *parts) -> float:
+        digest = hashlib.sha256(json.dumps([self.seed, *parts]).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+    def _create(self, model, messages, **params):
+        key = request_key(model, messages, params)
+        with self._lock:
+            attempt = self._attempts[key]
+            self._attempts[key] += 1
+            self.stats["requests"] += 1
+
+        delay = self.latency + self.jitter * self._draw(key, attempt, "latency")
+        time.sleep(delay)
+        with self._lock:
+            self.latencies.append(delay)
+
+        if self._draw(key, attempt, "429") < self.rate_limit:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            raise self._rate_limit_error()
+
+        record = self.recordings.get(key)
+        with self._lock:
+            self.stats["replayed" if record else "synthesized"] += 1
+        if record:
+            usage = record.get("usage") or {}
+            return make_response(record["content"], usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+        content = synthesize_content(messages, params)
+        prompt_tokens = sum(count_tokens(m["content"], model) for m in messages)
+        return make_response(content, prompt_tokens, count_tokens(content, model))
+
+    def _rate_limit_error(self):
+        import httpx
+        from openai import RateLimitError
+
+        request = httpx.Request("POST", "https://stand-in.invalid/v1/chat/completions")
+        response = httpx.Response(429, headers={"retry-after": str(self.retry_after)}, request=request)
+        return RateLimitError("Rate limit reached (simulated)", response=response, body=None)
+
+class RecordingClient:
+    """Wrap a client and append every response to a recordings file for StandInClient."""
+
+    def __init__(self, client, path, lock: threading.Lock = None):
+        self.client = client
+        self.path = path
+        self._lock = lock or threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self._create))
+
+    def with_options(self, **options):
+        return RecordingClient(self.client.with_options(**options), self.path, self._lock)
+
+    def _create(self, model, messages, **params):
+        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        usage = getattr(response, "usage", None)
+        record = {
+            "key": request_key(model, messages, params),
+            "model": model,
+            "content": response.choices[0].message.content,
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+            },
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return response
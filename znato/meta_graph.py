@@ -0,0 +1,173 @@
+import re
+from typing import Iterable
+from slugify import slugify
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDF_PROPERTY = "http://www.w3.org/1999/02/22-rdf-syntax-ns#Property"
+RDFS_CLASS = "http://www.w3.org/2000/01/rdf-schema#Class"
+RDFS_DOMAIN = "http://www.w3.org/2000/01/rdf-schema#domain"
+RDFS_RANGE = "http://www.w3.org/2000/01/rdf-schema#range"
+
+OUTPUT_FORMATS = ("turtle", "nt")
+
+# Edge keys pack the source, target and type slug ids into one integer.
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+_LOCAL_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+class MetaGraphAggregator:
+    """Deduplicated union of meta-graphs, keyed by slugs.
+
+    Concepts are merged by slugify(id), the last one seen winning but
+    keeping the position of the first, and relationships by the slugs of
+    their source, target and type, the first one seen winning, exactly as
+    aggregate_meta_graphs() always has. Every distinct string is slugified
+    once: slugs are interned as integer ids and each relationship is stored
+    under a single integer packing its three ids.
+    """
+
+    def __init__(self):
+        self.slugs = []
+        self._slug_ids = {}
+        self._memo = {}
+        self.concepts = {}  # slug id -> concept
+        self.edges = {}     # packed (source, target, type) ids -> relationship
+
+    @classmethod
+    def from_graphs(cls, graphs: Iterable):
+        aggregator = cls()
+        aggregator.update(graphs)
+        return aggregator
+
+    def slug_id(self, text: str) -> int:
+        sid = self._memo.get(text)
+        if sid is None:
+            slug = slugify(text)
+            sid = self._slug_ids.get(slug)
+            if sid is None:
+                sid = self._slug_ids[slug] = len(self.slugs)
+                self.slugs.append(slug)
+            self._memo[text] = sid
+        return sid
+
+    def add(self, graph):
+        slug_id = self.slug_id
+        concepts = self.concepts
+        edges = self.edges
+        for c in graph.concepts:
+            concepts[slug_id(c.id)] = c
+        for r in graph.relationships:
+            key = (slug_id(r.source) << (2 * _ID_BITS)) | (slug_id(r.target) << _ID_BITS) | slug_id(r.type)
+            if key not in edges:
+                edges[key] = r
+
+    def update(self, graphs: Iterable):
+        for graph in graphs:
+            self.add(graph)
+
+    def edge_ids(self):
+        """Yield (source, target, type) slug ids of the relationships in insertion order."""
+        for key in self.edges:
+            yield key >> (2 * _ID_BITS), (key >> _ID_BITS) & _ID_MASK, key & _ID_MASK
+
+    def local_names(self):
+        """IRI local names of all slugs, as save_meta_graph_as_turtle() has always written them."""
+        return [slug.replace("-", "_") for slug in self.slugs]
+
+# --- Writers ---
+
+def _property_tables(aggregator: MetaGraphAggregator) -> dict:
+    """Map each property slug id to its (domains, ranges) slug ids, deduplicated in first-seen order."""
+    properties = {}
+    for source, target, prop in aggregator.edge_ids():
+        tables = properties.get(prop)
+        if tables is None:
+            tables = properties[prop] = ({}, {})
+        tables[0][source] = None
+        tables[1][target] = None
+    return properties
+
+def write_ntriples(aggregator: MetaGraphAggregator, f, base_uri: str, sort: bool = False) -> int:
+    """Write the ontology as N-Triples and return the number of triples.
+
+    Triples are streamed class by class and property by property, or with
+    sort=True buffered and written in sorted order, which does not depend
+    on the order of the input.
+    """
+    iris = [f"<{base_uri}{name}>" for name in aggregator.local_names()]
+    is_class = f" <{RDF_TYPE}> <{RDFS_CLASS}> .\n"
+    is_property = f" <{RDF_TYPE}> <{RDF_PROPERTY}> .\n"
+    domain = f" <{RDFS_DOMAIN}> "
+    range_ = f" <{RDFS_RANGE}> "
+
+    def lines():
+        for sid in aggregator.concepts:
+            yield iris[sid] + is_class
+        for prop, (domains, ranges) in _property_tables(aggregator).items():
+            subject = iris[prop]
+            yield subject + is_property
+            for sid in domains:
+                yield f"{subject}{domain}{iris[sid]} .\n"
+            for sid in ranges:
+                yield f"{subject}{range_}{iris[sid]} .\n"
+
+    output = sorted(lines()) if sort else lines()
+    count = 0
+    buffer = []
+    for line in output:
+        buffer.append(line)
+        if len(buffer) >= 10000:
+            f.write("".join(buffer))
+            count += len(buffer)
+            buffer = []
+    f.write("".join(buffer))
+    return count + len(buffer)
+
+def write_turtle(aggregator: MetaGraphAggregator, f, base_uri: str, sort: bool = False) -> int:
+    """Write the ontology as Turtle grouped by subject and return the number of triples.
+
+    Each subject is written once with its types, domains and ranges. With
+    sort=True subjects and objects are sorted by name.
+    """
+    names = aggregator.local_names()
+    terms = [f":{name}" if _LOCAL_NAME.match(name) else f"<{base_uri}{name}>" for name in names]
+    classes = aggregator.concepts
+    properties = _property_tables(aggregator)
+    subjects = list(classes) + [prop for prop in properties if prop not in classes]
+    if sort:
+        subjects.sort(key=names.__getitem__)
+
+    f.write(f"@prefix : <{base_uri}> .\n")
+    f.write("@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .\n")
+    f.write("@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n")
+    count = 0
+    buffer = []
+    for sid in subjects:
+        tables = properties.get(sid)
+        if tables is None:
+            buffer.append(f"\n{terms[sid]} a rdfs:Class .\n")
+            count += 1
+            continue
+        domains, ranges = (sorted(t, key=names.__getitem__) for t in tables) if sort else tables
+        types = "a rdfs:Class, rdf:Property" if sid in classes else "a rdf:Property"
+        buffer.append(
+            f"\n{terms[sid]} {types} ;\n"
+            f"    rdfs:domain {', '.join([terms[o] for o in domains])} ;\n"
+            f"    rdfs:range {', '.join([terms[o] for o in ranges])} .\n"
+        )
+        count += (2 if sid in classes else 1) + len(tables[0]) + len(tables[1])
+        if len(buffer) >= 10000:
+            f.write("".join(buffer))
+            buffer = []
+    f.write("".join(buffer))
+    return count
+
+def write_ontology(aggregator: MetaGraphAggregator, output_path: str, base_uri: str, output_format: str = "turtle", sort: bool = False) -> int:
+    """Write the ontology to a file in the given format ("turtle" or "nt") and return the number of triples."""
+    writer = {"turtle": write_turtle, "nt": write_ntriples}[output_format]
+    with open(output_path, "w", encoding="utf-8", buffering=1024 * 1024) as f:
+        return writer(aggregator, f, base_uri, sort)
+
+def guess_format(output_path: str) -> str:
+    return "nt" if output_path.lower().endswith(".nt") else "turtle"
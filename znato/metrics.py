@@ -0,0 +1,310 @@
+import time
+import bisect
+import cProfile
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from .fileutil import write_atomic, write_json_atomic
+
+# Upper bounds in seconds of the LLM request latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Number of most recent LLM request attempts kept individually in the JSON report.
+REQUEST_LOG_SIZE = 1000
+
+class Histogram:
+    """Latency histogram with Prometheus-style buckets; raw values are kept for percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.values = []
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": len(self.values),
+            "sum_s": sum(self.values),
+            "p50_s": self.percentile(50),
+            "p90_s": self.percentile(90),
+            "p99_s": self.percentile(99),
+            "buckets": buckets,
+        }
+
+class LLMRequest:
+    """Handle of one timed LLM request; call record(response) to keep its token usage."""
+
+    def __init__(self):
+        self.usage = None
+
+    def record(self, response):
+        self.usage = getattr(response, "usage", None)
+
+class RunMetrics:
+    """Stage timings, LLM usage and counters of one command run.
+
+    span(name) times a stage. Spans nest per thread: `total` includes
+    nested spans and `self` excludes them, so a stage that pulls its input
+    from a lazily timed upstream stage (see timed_iter) is not charged for
+    it. Spans in worker threads are summed, so their totals can exceed the
+    wall time of the run.
+
+    LLM requests are grouped by operation and model, with a latency
+    histogram over every attempt, prompt and completion tokens from the
+    response `usage`, errors by type and retries. The most recent
+    REQUEST_LOG_SIZE attempts are also kept one by one, so that a slow or
+    expensive call can be traced.
+    """
+
+    def __init__(self, command: str = ""):
+        self.command = command
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.spans = {}
+        self.llm = {}
+        self.requests = deque(maxlen=REQUEST_LOG_SIZE)
+        self.counters = Counter()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str):
+        stack = self._stack()
+        children = [0.0]
+        stack.append(children)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            with self._lock:
+                span = self.spans.setdefault(name, {"count": 0, "total_s": 0.0, "self_s": 0.0})
+                span["count"] += 1
+                span["total_s"] += elapsed
+                span["self_s"] += elapsed - children[0]
+
+    def timed_iter(self, name: str, iterable):
+        """Yield from iterable, timing the production of each item as a span."""
+        iterator = iter(iterable)
+        while True:
+            with self.span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _llm_entry(self, operation: str, model: str) -> dict:
+        key = (operation, model)
+        entry = self.llm.get(key)
+        if entry is None:
+            entry = self.llm[key] = {
+                "requests": 0,
+                "retries": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "errors": Counter(),
+                "latency": Histogram(),
+            }
+        return entry
+
+    @contextmanager
+    def llm_request(self, operation: str, model: str, attempt: int = 0):
+        """Time one LLM request attempt; exceptions are counted by type and re-raised."""
+        request = LLMRequest()
+        error = None
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            with self.span("llm"):
+                yield request
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            prompt_tokens = completion_tokens = 0
+            if request.usage is not None:
+                prompt_tokens = getattr(request.usage, "prompt_tokens", 0) or 0
+                completion_tokens = getattr(request.usage, "completion_tokens", 0) or 0
+            with self._lock:
+                entry = self._llm_entry(operation, model)
+                entry["requests"] += 1
+                entry["latency"].observe(elapsed)
+                if error:
+                    entry["errors"][error] += 1
+                entry["prompt_tokens"] += prompt_tokens
+                entry["completion_tokens"] += completion_tokens
+                self.requests.append({
+                    "operation": operation,
+                    "model": model,
+                    "attempt": attempt,
+                    "started_s": started - self.started,
+                    "latency_s": elapsed,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "error": error,
+                })
+
+    def llm_retry(self, operation: str, model: str):
+        with self._lock:
+            self._llm_entry(operation, model)["retries"] += 1
+
+    def finish(self):
+        self.finished = time.time()
+
+    # --- Export ---
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            end = self.finished or time.time()
+            return {
+                "command": self.command,
+                "started": self.started,
+                "duration_s": end - self.started,
+                "spans": {name: dict(span) for name, span in sorted(self.spans.items())},
+                "llm": [
+                    {
+                        "operation": operation,
+                        "model": model,
+                        "requests": entry["requests"],
+                        "retries": entry["retries"],
+                        "errors": dict(entry["errors"]),
+                        "prompt_tokens": entry["prompt_tokens"],
+                        "completion_tokens": entry["completion_tokens"],
+                        "latency": entry["latency"].to_dict(),
+                    }
+                    for (operation, model), entry in sorted(self.llm.items())
+                ],
+                "requests": list(self.requests),
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def prometheus_text(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        report = self.to_dict()
+        command = _escape(self.command)
+        lines = []
+
+        def label_text(labels):
+            return ",".join([f'command="{command}"'] + [f'{k}="{_escape(v)}"' for k, v in labels])
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{{{label_text(labels)}}} {value}")
+
+        metric("znato_run_start_time_seconds", "gauge", "Unix time the run started.", [((), report["started"])])
+        metric("znato_run_duration_seconds", "gauge", "Wall time of the run.", [((), report["duration_s"])])
+
+        spans = report["spans"]
+        metric("znato_stage_runs_total", "counter", "Times each stage ran.",
+               [((("stage", n),), s["count"]) for n, s in spans.items()])
+        metric("znato_stage_seconds_total", "counter", "Time spent in each stage, including nested stages.",
+               [((("stage", n),), s["total_s"]) for n, s in spans.items()])
+        metric("znato_stage_self_seconds_total", "counter", "Time spent in each stage, excluding nested stages.",
+               [((("stage", n),), s["self_s"]) for n, s in spans.items()])
+
+        llm = [((("operation", e["operation"]), ("model", e["model"])), e) for e in report["llm"]]
+        metric("znato_llm_requests_total", "counter", "LLM requests, including retried attempts.",
+               [(labels, e["requests"]) for labels, e in llm])
+        metric("znato_llm_retries_total", "counter", "LLM requests retried after a rate limit or transient API error.",
+               [(labels, e["retries"]) for labels, e in llm])
+        metric("znato_llm_errors_total", "counter", "Failed LLM requests by error type.",
+               [(labels + (("error", error),), count) for labels, e in llm for error, count in e["errors"].items()])
+        metric("znato_llm_tokens_total", "counter", "Tokens reported in the LLM responses' usage.",
+               [(labels + (("type", kind),), e[f"{kind}_tokens"]) for labels, e in llm for kind in ("prompt", "completion")])
+
+        lines.append("# HELP znato_llm_request_duration_seconds Latency of LLM requests.")
+        lines.append("# TYPE znato_llm_request_duration_seconds histogram")
+        for labels, e in llm:
+            for bound, count in e["latency"]["buckets"].items():
+                lines.append(f'znato_llm_request_duration_seconds_bucket{{{label_text(labels + (("le", bound),))}}} {count}')
+            lines.append(f"znato_llm_request_duration_seconds_sum{{{label_text(labels)}}} {e['latency']['sum_s']}")
+            lines.append(f"znato_llm_request_duration_seconds_count{{{label_text(labels)}}} {e['latency']['count']}")
+
+        metric("znato_items_total", "counter", "Items processed, by kind.",
+               [((("item", n),), v) for n, v in report["counters"].items()])
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        write_json_atomic(path, self.to_dict(), indent=2)
+
+    def write_prometheus(self, path: str):
+        """Write a textfile for the node_exporter textfile collector (atomically, as it requires)."""
+        write_atomic(path, self.prometheus_text())
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# --- Shared run metrics ---
+
+_metrics = RunMetrics()
+
+def get_metrics() -> RunMetrics:
+    """Return the metrics of the current run."""
+    return _metrics
+
+def reset_metrics(command: str = "") -> RunMetrics:
+    global _metrics
+    _metrics = RunMetrics(command)
+    return _metrics
+
+def add_metrics_arguments(parser):
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--metrics_json", default=None, help="Write a JSON run report with stage timings, LLM latency and token usage")
+    group.add_argument("--metrics_prom", default=None, help="Write the run metrics as a Prometheus textfile")
+    group.add_argument("--profile", default=None, help="Profile the run with cProfile and write the stats to this file")
+
+@contextmanager
+def instrumented(command: str, parsed_args):
+    """Collect metrics for a command run and export them as requested by its arguments.
+
+    The reports are written even when the run fails, so a crashed run still
+    shows where its time went. cProfile sees only the calling thread.
+    """
+    metrics = reset_metrics(command)
+    profiler = cProfile.Profile() if parsed_args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        with metrics.span("run"):
+            yield metrics
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(parsed_args.profile)
+        metrics.finish()
+        if parsed_args.metrics_json:
+            metrics.write_json(parsed_args.metrics_json)
+        if parsed_args.metrics_prom:
+            metrics.write_prometheus(parsed_args.metrics_prom)
@@ -0,0 +1,123 @@
+from array import array
+from rdflib import RDF, RDFS, OWL
+from rdflib.namespace import split_uri
+
+from .ontology_snapshot import load_cached, load_snapshot
+
+CLASS_TYPES = (OWL.Class, RDFS.Class)
+PROPERTY_TYPES = {OWL.ObjectProperty: "object", OWL.DatatypeProperty: "datatype"}
+
+class OntologyIndex:
+    """Classes, properties, labels and class axioms of an ontology.
+
+    Built with one predicate-indexed lookup per predicate of interest rather
+    than by scanning every triple. Terms are interned once and everything
+    else refers to them by integer id.
+    """
+
+    def __init__(self):
+        self.terms = []
+        self._ids = {}
+        self.declared_classes = array("I")
+        self.classes = array("I")
+        self.object_properties = array("I")
+        self.datatype_properties = array("I")
+        self.labels = {}
+        self.subclass_edges = []
+        self.equivalent_pairs = []
+
+    def intern(self, term) -> int:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_ids"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._ids = {term: k for k, term in enumerate(self.terms)}
+
+    @classmethod
+    def from_graph(cls, graph) -> "OntologyIndex":
+        """Index an rdflib Graph or an OntologySnapshot."""
+        index = cls()
+        seen_classes = set()
+
+        def add_class(term_id):
+            if term_id not in seen_classes:
+                seen_classes.add(term_id)
+                index.classes.append(term_id)
+
+        declared = set()
+        properties = {"object": set(), "datatype": set()}
+        for s, _, o in graph.triples((None, RDF.type, None)):
+            if o in CLASS_TYPES:
+                term_id = index.intern(s)
+                add_class(term_id)
+                if term_id not in declared:
+                    declared.add(term_id)
+                    index.declared_classes.append(term_id)
+            elif o in PROPERTY_TYPES:
+                term_id = index.intern(s)
+                kind = PROPERTY_TYPES[o]
+                if term_id not in properties[kind]:
+                    properties[kind].add(term_id)
+                    target = index.object_properties if kind == "object" else index.datatype_properties
+                    target.append(term_id)
+
+        for s, _, o in graph.triples((None, RDFS.subClassOf, None)):
+            sub_id, super_id = index.intern(s), index.intern(o)
+            add_class(sub_id)
+            add_class(super_id)
+            index.subclass_edges.append((sub_id, super_id))
+
+        for s, _, o in graph.triples((None, OWL.equivalentClass, None)):
+            index.equivalent_pairs.append((index.intern(s), index.intern(o)))
+
+        for s, _, label in graph.triples((None, RDFS.label, None)):
+            term_id = index._ids.get(s)
+            if term_id is not None and term_id not in index.labels:
+                index.labels[term_id] = str(label)
+
+        return index
+
+    def term(self, term_id: int):
+        return self.terms[term_id]
+
+    def local_name(self, term_id: int) -> str:
+        """Part of the URI after the last '#'."""
+        return str(self.terms[term_id]).split("#")[-1]
+
+    def label_or_localname(self, term_id: int) -> str:
+        """rdfs:label if exists, otherwise local part of URI."""
+        label = self.labels.get(term_id)
+        if label is not None:
+            return label
+        term = self.terms[term_id]
+        try:
+            _, local = split_uri(term)
+            return local
+        except Exception:
+            return str(term)
+
+    def class_names(self) -> set:
+        """Local names of all classes declared as owl:Class or rdfs:Class."""
+        return {self.local_name(k) for k in self.declared_classes}
+
+    def property_names(self) -> set:
+        """Local names of all object and datatype properties."""
+        return {self.local_name(k) for k in (*self.object_properties, *self.datatype_properties)}
+
+def build_ontology_index(path) -> OntologyIndex:
+    return OntologyIndex.from_graph(load_snapshot(path))
+
+def load_ontology_index(ttl_path: str, use_cache: bool = True) -> OntologyIndex:
+    """Return the index of a Turtle file, cached next to its snapshot."""
+    if not use_cache:
+        return OntologyIndex.from_graph(load_snapshot(ttl_path, use_cache=False))
+    return load_cached(ttl_path, "index", build_ontology_index)
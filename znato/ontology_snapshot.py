@@ -0,0 +1,254 @@
+import os
+import json
+import pickle
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from rdflib import Graph, URIRef, BNode, Literal
+from rich.console import Console
+
+from .fileutil import file_sha256, write_atomic
+
+SNAPSHOT_VERSION = 1
+
+def cache_dir() -> Path:
+    """Directory holding ontology snapshots (ZNATO_CACHE_DIR or ~/.cache/znato)."""
+    return Path(os.getenv("ZNATO_CACHE_DIR") or Path.home() / ".cache" / "znato") / "snapshots"
+
+class OntologySnapshot:
+    """Compact, read-only triple table compiled from a Turtle file.
+
+    Terms are interned once as plain strings and triples are stored as three
+    integer columns, so a snapshot unpickles in milliseconds; rdflib terms
+    are only materialised when a triple using them is returned. It implements
+    the subset of the rdflib Graph API the commands use: triples() with any
+    pattern, `in`, iteration and len(). Indexes are built on first use.
+    """
+
+    def __init__(self, texts, kinds, literals, subjects, predicates, objects):
+        self.texts = texts
+        self.kinds = kinds
+        self.literals = literals
+        self.subjects = subjects
+        self.predicates = predicates
+        self.objects = objects
+        self._reset()
+
+    def _reset(self):
+        self._terms = [None] * len(self.texts)
+        self._ids = None
+        self._by_subject = None
+        self._by_predicate = None
+
+    def __getstate__(self):
+        return (self.texts, self.kinds, self.literals, self.subjects, self.predicates, self.objects)
+
+    def __setstate__(self, state):
+        self.texts, self.kinds, self.literals, self.subjects, self.predicates, self.objects = state
+        self._reset()
+
+    @staticmethod
+    def _key(term):
+        if isinstance(term, Literal):
+            return ("l", str(term), term.datatype, term.language)
+        if isinstance(term, BNode):
+            return ("b", str(term))
+        return str(term)
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> "OntologySnapshot":
+        ids = {}
+        texts = []
+        kinds = bytearray()
+        literals = {}
+        columns = (array("I"), array("I"), array("I"))
+        for triple in graph:
+            for column, term in zip(columns, triple):
+                key = cls._key(term)
+                term_id = ids.get(key)
+                if term_id is None:
+                    term_id = ids[key] = len(texts)
+                    texts.append(str(term))
+                    if isinstance(term, Literal):
+                        kinds.append(ord("l"))
+                        literals[term_id] = (term.datatype, term.language)
+                    else:
+                        kinds.append(ord("b") if isinstance(term, BNode) else ord("u"))
+                column.append(term_id)
+        return cls(texts, bytes(kinds), literals, *columns)
+
+    def term(self, term_id: int):
+        term = self._terms[term_id]
+        if term is None:
+            kind = self.kinds[term_id]
+            text = self.texts[term_id]
+            if kind == ord("u"):
+                # The text came from a parsed URIRef, so skip re-validating it.
+                term = str.__new__(URIRef, text)
+            elif kind == ord("b"):
+                term = BNode(text)
+            else:
+                datatype, language = self.literals[term_id]
+                term = Literal(text, lang=language, datatype=datatype)
+            self._terms[term_id] = term
+        return term
+
+    def _term_id(self, term):
+        if self._ids is None:
+            self._ids = {}
+            for k, text in enumerate(self.texts):
+                kind = self.kinds[k]
+                if kind == ord("u"):
+                    self._ids[text] = k
+                elif kind == ord("b"):
+                    self._ids[("b", text)] = k
+                else:
+                    self._ids[("l", text) + self.literals[k]] = k
+        return self._ids.get(self._key(term))
+
+    @staticmethod
+    def _index(column):
+        index = {}
+        for position, term_id in enumerate(column):
+            index.setdefault(term_id, array("I")).append(position)
+        return index
+
+    def _positions(self, sid, pid):
+        if sid is not None:
+            if self._by_subject is None:
+                self._by_subject = self._index(self.subjects)
+            return self._by_subject.get(sid, ())
+        if pid is not None:
+            if self._by_predicate is None:
+                self._by_predicate = self._index(self.predicates)
+            return self._by_predicate.get(pid, ())
+        return range(len(self.subjects))
+
+    def triples(self, pattern):
+        ids = []
+        for term in pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self._term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+        sid, pid, oid = ids
+
+        term = self.term
+        for k in self._positions(sid, pid):
+            if sid is not None and self.subjects[k] != sid:
+                continue
+            if pid is not None and self.predicates[k] != pid:
+                continue
+            if oid is not None and self.objects[k] != oid:
+                continue
+            yield term(self.subjects[k]), term(self.predicates[k]), term(self.objects[k])
+
+    def __contains__(self, triple):
+        return next(self.triples(triple), None) is not None
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def to_graph(self) -> Graph:
+        graph = Graph()
+        graph.addN((s, p, o, graph) for s, p, o in self)
+        return graph
+
+@contextmanager
+def _locked(lock_path: Path):
+    """Hold an exclusive lock on lock_path across processes."""
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _read_registry(registry_path: Path) -> dict:
+    try:
+        with open(registry_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _register(directory: Path, key: str, entry: dict):
+    """Record a file's hash in files.json, deleting the artifacts of its previous hash once unused.
+
+    The registry is re-read and rewritten under a lock, so processes
+    caching different files at the same time keep each other's entries.
+    """
+    registry_path = directory / "files.json"
+    with _locked(directory / "files.json.lock"):
+        registry = _read_registry(registry_path)
+        previous = registry.get(key, {}).get("sha256")
+        registry[key] = entry
+        if previous and previous != entry["sha256"] and all(e["sha256"] != previous for e in registry.values()):
+            for stale in directory.glob(f"{previous}.*"):
+                stale.unlink(missing_ok=True)
+        write_atomic(registry_path, json.dumps(registry))
+
+def load_cached(ttl_path: str, kind: str, build, version: int = SNAPSHOT_VERSION):
+    """Return an artifact derived from a Turtle file, building and caching it when needed.
+
+    Artifacts are stored as `<sha256>.<kind>` under the SHA-256 of the file's
+    contents, so any change to the TTL file invalidates them. The hash itself
+    is only recomputed when the file's size or mtime changed since the last
+    run. `build(path)` creates the artifact on a cache miss.
+    """
+    path = Path(ttl_path).resolve()
+    directory = cache_dir()
+    stat = path.stat()
+    entry = _read_registry(directory / "files.json").get(str(path))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        digest = entry["sha256"]
+    else:
+        digest = file_sha256(path)
+
+    artifact_path = directory / f"{digest}.{kind}"
+    try:
+        with open(artifact_path, "rb") as f:
+            cached_version, artifact = pickle.load(f)
+        if cached_version == version:
+            return artifact
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+        pass
+
+    artifact = build(path)
+
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(artifact_path, pickle.dumps((version, artifact), protocol=pickle.HIGHEST_PROTOCOL))
+        _register(directory, str(path), {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest})
+    except OSError as e:
+        Console().print(f"[yellow]Could not write ontology snapshot: {e}[/yellow]")
+    return artifact
+
+def compile_snapshot(path) -> OntologySnapshot:
+    graph = Graph()
+    graph.parse(str(path), format="turtle")
+    return OntologySnapshot.from_graph(graph)
+
+def load_snapshot(ttl_path: str, use_cache: bool = True) -> OntologySnapshot:
+    """Return the snapshot of a Turtle file, compiling and caching it when needed."""
+    if not use_cache:
+        return compile_snapshot(ttl_path)
+    return load_cached(ttl_path, "snapshot", compile_snapshot)
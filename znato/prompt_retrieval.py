@@ -0,0 +1,150 @@
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+from typing import Iterable, List
+
+from .chunking import count_tokens
+from .swrl_rules import parse_rules
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_WORD = re.compile(r"[^\W_]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "has", "have",
+    "how", "in", "is", "it", "of", "on", "or", "the", "to", "what", "when", "which", "who", "why", "with",
+}
+
+# Score kept by a rule reached through one step of the rule dependency graph.
+EXPANSION_DECAY = 0.5
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words with camelCase and snake_case split and plural 's' removed."""
+    tokens = []
+    for word in _WORD.findall(_CAMEL.sub(" ", text)):
+        word = word.lower()
+        if len(word) < 2 or word.isdigit() or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+class BM25:
+    """Okapi BM25 over tokenized documents, scored through an inverted index."""
+
+    def __init__(self, documents: Iterable[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for doc_id, tokens in enumerate(documents):
+            self.lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                self.postings[token].append((doc_id, tf))
+        n = len(self.lengths)
+        self.average_length = (sum(self.lengths) / n) if n else 1
+        self.idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self.postings.items()
+        }
+
+    def scores(self, query: Iterable[str]) -> dict:
+        scores = defaultdict(float)
+        for token in set(query):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[token]:
+                norm = 1 - self.b + self.b * self.lengths[doc_id] / (self.average_length or 1)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+class PromptRetriever:
+    """Pick the SWRL rules and ontology entities relevant to a question.
+
+    Rules and entity names are ranked with BM25 against the question. Each
+    selected rule pulls in the entities it mentions and, up to expand_hops
+    steps away, the rules it depends on (rules concluding one of its
+    conditions) and the rules depending on it. Items are added best score
+    first while they fit in the token budget.
+    """
+
+    def __init__(self, ontology, swrl_rules: str, expand_hops: int = 2, model: str = "gpt-4o"):
+        self.model = model
+        self.expand_hops = expand_hops
+        self.rules = parse_rules(swrl_rules)
+        self.classes = sorted(ontology.class_names())
+        self.properties = sorted(ontology.property_names())
+        self.entities = self.classes + self.properties
+
+        self.rule_index = BM25(tokenize(rule.text) for rule in self.rules)
+        self.entity_index = BM25(tokenize(name) for name in self.entities)
+        self.rule_cost = [count_tokens(rule.text, model) + 1 for rule in self.rules]
+        self.entity_cost = [count_tokens(name, model) + 1 for name in self.entities]
+
+        entity_ids = {name: k for k, name in enumerate(self.entities)}
+        producers = defaultdict(set)
+        consumers = defaultdict(set)
+        self.rule_entities = []
+        self.entity_rules = defaultdict(list)
+        for k, rule in enumerate(self.rules):
+            for atom in rule.head:
+                producers[atom.name].add(k)
+            for atom in rule.body:
+                consumers[atom.name].add(k)
+            names = {atom.name for atom in rule.body + rule.head}
+            self.rule_entities.append(sorted(entity_ids[n] for n in names if n in entity_ids))
+            for entity_id in self.rule_entities[-1]:
+                self.entity_rules[entity_id].append(k)
+
+        self.rule_neighbours = []
+        for k, rule in enumerate(self.rules):
+            neighbours = set()
+            for atom in rule.body:
+                neighbours |= producers[atom.name]
+            for atom in rule.head:
+                neighbours |= consumers[atom.name]
+            neighbours.discard(k)
+            self.rule_neighbours.append(sorted(neighbours))
+
+    def select(self, question: str, budget: int):
+        """Return (rules_text, classes, properties) fitting in `budget` tokens."""
+        query = tokenize(question)
+        rule_scores = self.rule_index.scores(query)
+        entity_scores = self.entity_index.scores(query)
+        # A rule mentioning a matching entity is relevant even if its own text scores low.
+        for entity_id, score in entity_scores.items():
+            for k in self.entity_rules.get(entity_id, ()):
+                rule_scores[k] += score / 2
+
+        # Heap of (-score, kind, id, hops); rules sort before entities on ties.
+        heap = [(-score, 0, k, 0) for k, score in rule_scores.items()]
+        heap += [(-score, 1, k, 0) for k, score in entity_scores.items()]
+        heapq.heapify(heap)
+
+        chosen_rules = set()
+        chosen_entities = set()
+        remaining = budget
+        while heap and remaining > 0:
+            neg_score, kind, item, hops = heapq.heappop(heap)
+            if kind == 1:
+                if item not in chosen_entities and self.entity_cost[item] <= remaining:
+                    chosen_entities.add(item)
+                    remaining -= self.entity_cost[item]
+                continue
+            if item in chosen_rules or self.rule_cost[item] > remaining:
+                continue
+            chosen_rules.add(item)
+            remaining -= self.rule_cost[item]
+            for entity_id in self.rule_entities[item]:
+                heapq.heappush(heap, (neg_score, 1, entity_id, hops))
+            if hops < self.expand_hops:
+                for other in self.rule_neighbours[item]:
+                    if other not in chosen_rules:
+                        heapq.heappush(heap, (neg_score * EXPANSION_DECAY, 0, other, hops + 1))
+
+        rules_text = "\n".join(self.rules[k].text for k in sorted(chosen_rules))
+        classes = [self.entities[k] for k in sorted(chosen_entities) if k < len(self.classes)]
+        properties = [self.entities[k] for k in sorted(chosen_entities) if k >= len(self.classes)]
+        return rules_text, classes, properties
@@ -0,0 +1,87 @@
+import time
+import random
+import threading
+
+class RateLimiter:
+    """Token-bucket limiter for requests per minute and tokens per minute.
+
+    A limit of 0 disables that bucket. Safe to share between threads: acquire()
+    blocks until both buckets can cover the request, and pause() holds every
+    caller back after a 429 response.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request using `tokens` tokens fits in both buckets."""
+        if self.tokens_per_minute:
+            # A single request larger than the whole bucket would never fit.
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.requests_per_minute and self._requests < 1:
+                        wait = (1 - self._requests) * 60 / self.requests_per_minute
+                    elif self.tokens_per_minute and self._tokens < tokens:
+                        wait = (tokens - self._tokens) * 60 / self.tokens_per_minute
+                    else:
+                        if self.requests_per_minute:
+                            self._requests -= 1
+                        if self.tokens_per_minute:
+                            self._tokens -= tokens
+                        return
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds`, e.g. after a 429 response."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+def retry_after_seconds(error, attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Return how long to wait before retrying after a rate-limit error.
+
+    Uses the Retry-After header when the server sends one, otherwise
+    exponential backoff with jitter.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return min(float(value) * scale, max_delay)
+            except ValueError:
+                pass
+    delay = min(base_delay * 2 ** attempt, max_delay)
+    return delay * (0.5 + random.random() / 2)
+
+def is_transient_error(error) -> bool:
+    """True for API errors worth retrying: 429s and the errors the OpenAI SDK retries itself.
+
+    These are connection errors and timeouts, and 408, 409 and 5xx responses.
+    """
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
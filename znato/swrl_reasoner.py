@@ -0,0 +1,352 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from rdflib import RDF, RDFS, OWL, BNode, Literal
+from rdflib.namespace import split_uri
+
+from .prompt_retrieval import tokenize
+from .swrl_rules import Atom, Rule, parse_atoms
+
+VOCABULARY_NAMESPACES = (str(RDF), str(RDFS), str(OWL))
+
+BUILTINS = {
+    "equal": lambda a, b: a == b,
+    "sameAs": lambda a, b: a == b,
+    "notEqual": lambda a, b: a != b,
+    "differentFrom": lambda a, b: a != b,
+    "lessThan": lambda a, b: a < b,
+    "lessThanOrEqual": lambda a, b: a <= b,
+    "greaterThan": lambda a, b: a > b,
+    "greaterThanOrEqual": lambda a, b: a >= b,
+}
+
+class Fact(NamedTuple):
+    predicate: str
+    args: Tuple
+
+    def __str__(self):
+        return f"{self.predicate}({', '.join(str(a) for a in self.args)})"
+
+class Derivation(NamedTuple):
+    rule: str
+    premises: Tuple[Fact, ...]
+
+class Variable(str):
+    """A rule variable such as ?x, told apart from constants by type in the join loops."""
+
+def is_builtin(atom: Atom) -> bool:
+    return atom.name in BUILTINS and (atom.predicate.startswith("swrlb:") or atom.name in ("sameAs", "differentFrom"))
+
+def is_variable(arg) -> bool:
+    return isinstance(arg, str) and arg.startswith("?")
+
+def parse_constant(arg: str):
+    """Turn a rule argument into a value: quoted strings, numbers, booleans, else an individual name."""
+    if len(arg) >= 2 and arg[0] == arg[-1] and arg[0] in "\"'":
+        return arg[1:-1]
+    if arg in ("true", "false"):
+        return arg == "true"
+    for convert in (int, float):
+        try:
+            return convert(arg)
+        except ValueError:
+            pass
+    return re.split(r"[:#]", arg)[-1]
+
+def term_value(term):
+    """Individuals by local name, literals as Python values."""
+    if isinstance(term, Literal):
+        value = term.toPython()
+        return str(value) if isinstance(value, Literal) else value
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    try:
+        return split_uri(term)[1]
+    except Exception:
+        return str(term)
+
+class CompiledRule(NamedTuple):
+    label: str
+    atoms: Tuple[Atom, ...]
+    builtins: Tuple[Atom, ...]
+    head: Tuple[Atom, ...]
+
+def compile_rule(label: str, body: Iterable[Atom], head: Iterable[Atom]) -> CompiledRule:
+    """Drop namespace prefixes from predicates and parse constant arguments."""
+    def bind(atom):
+        return Atom(atom.name, tuple(Variable(a) if is_variable(a) else parse_constant(a) for a in atom.args))
+
+    body = list(body)
+    return CompiledRule(
+        label,
+        tuple(bind(a) for a in body if not is_builtin(a)),
+        tuple(bind(a) for a in body if is_builtin(a)),
+        tuple(bind(a) for a in head),
+    )
+
+def join_order(first: Atom, rest: Iterable[Atom]) -> Tuple[Atom, ...]:
+    """Order body atoms so that each next one has the most arguments already bound."""
+    bound = {a for a in first.args if is_variable(a)}
+    rest = list(rest)
+    order = []
+    while rest:
+        k = max(range(len(rest)), key=lambda i: sum(1 for a in rest[i].args if not is_variable(a) or a in bound))
+        atom = rest.pop(k)
+        order.append(atom)
+        bound.update(a for a in atom.args if is_variable(a))
+    return tuple(order)
+
+class ForwardChainer:
+    """Semi-naive forward chaining of SWRL rules over class and property facts.
+
+    Facts are indexed by predicate and by (predicate, position, value), so
+    each body atom is matched through its most selective bound argument.
+    Each round only joins rules against the facts derived in the previous
+    round. The first derivation of every inferred fact is kept as its trace.
+    """
+
+    def __init__(self, rules: Iterable[CompiledRule]):
+        self.rules = list(rules)
+        # Rules to re-join when facts of a predicate are new, with a join order per triggering atom.
+        self._triggers = defaultdict(list)
+        for rule in self.rules:
+            for k, atom in enumerate(rule.atoms):
+                plan = join_order(atom, rule.atoms[:k] + rule.atoms[k + 1:])
+                self._triggers[atom.predicate].append((rule, atom, plan))
+        self.facts = defaultdict(set)
+        self._index = defaultdict(set)
+        self.derivations: Dict[Fact, Derivation] = {}
+        self._pending = defaultdict(set)
+
+    def add(self, predicate: str, args: Tuple) -> bool:
+        """Assert a fact; returns False when it is already known."""
+        if args in self.facts[predicate]:
+            return False
+        self._store(predicate, args)
+        self._pending[predicate].add(args)
+        return True
+
+    def _store(self, predicate, args):
+        self.facts[predicate].add(args)
+        for position, value in enumerate(args):
+            self._index[(predicate, position, value)].add(args)
+
+    def holds(self, fact: Fact) -> bool:
+        return fact.args in self.facts.get(fact.predicate, ())
+
+    def inferred(self) -> List[Fact]:
+        return list(self.derivations)
+
+    def _candidates(self, atom: Atom, binding: dict):
+        best = None
+        for position, arg in enumerate(atom.args):
+            if isinstance(arg, Variable):
+                if arg not in binding:
+                    continue
+                value = binding[arg]
+            else:
+                value = arg
+            matches = self._index.get((atom.predicate, position, value), ())
+            if best is None or len(matches) < len(best):
+                best = matches
+        return self.facts.get(atom.predicate, ()) if best is None else best
+
+    @staticmethod
+    def _unify(atom: Atom, args: Tuple, binding: dict) -> Optional[dict]:
+        if len(args) != len(atom.args):
+            return None
+        result = binding
+        for pattern, value in zip(atom.args, args):
+            if isinstance(pattern, Variable):
+                bound = result.get(pattern)
+                if bound is None:
+                    if result is binding:
+                        result = dict(binding)
+                    result[pattern] = value
+                elif bound != value:
+                    return None
+            elif pattern != value:
+                return None
+        return result
+
+    def _builtins_hold(self, rule: CompiledRule, binding: dict) -> bool:
+        for atom in rule.builtins:
+            values = [binding.get(a) if isinstance(a, Variable) else a for a in atom.args]
+            if len(values) != 2 or any(v is None for v in values):
+                return False
+            try:
+                if not BUILTINS[atom.predicate](*values):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _join(self, plan: Tuple[Atom, ...], i: int, binding: dict, premises: List[Fact]):
+        if i == len(plan):
+            yield binding, premises
+            return
+        atom = plan[i]
+        for args in list(self._candidates(atom, binding)):
+            extended = self._unify(atom, args, binding)
+            if extended is not None:
+                yield from self._join(plan, i + 1, extended, premises + [Fact(atom.predicate, args)])
+
+    def run(self, max_rounds: int = None) -> int:
+        """Apply the rules until no new facts appear; returns the number inferred."""
+        total = 0
+        rounds = 0
+        while self._pending and (max_rounds is None or rounds < max_rounds):
+            delta, self._pending = self._pending, defaultdict(set)
+            rounds += 1
+            for predicate, new_facts in delta.items():
+                for rule, atom, plan in self._triggers.get(predicate, ()):
+                    for args in new_facts:
+                        binding = self._unify(atom, args, {})
+                        if binding is None:
+                            continue
+                        for full, premises in self._join(plan, 0, binding, [Fact(predicate, args)]):
+                            if rule.builtins and not self._builtins_hold(rule, full):
+                                continue
+                            for head in rule.head:
+                                values = tuple(full.get(a) if isinstance(a, Variable) else a for a in head.args)
+                                if any(v is None for v in values):
+                                    continue
+                                if self.add(head.predicate, values):
+                                    self.derivations[Fact(head.predicate, values)] = Derivation(rule.label, tuple(premises))
+                                    total += 1
+        return total
+
+    def explain(self, fact: Fact) -> List[Tuple[Fact, Optional[Derivation]]]:
+        """Return the derivation chain of a fact, premises before conclusions."""
+        chain = []
+        seen = set()
+
+        def visit(f):
+            if f in seen:
+                return
+            seen.add(f)
+            derivation = self.derivations.get(f)
+            if derivation is not None:
+                for premise in derivation.premises:
+                    visit(premise)
+            chain.append((f, derivation))
+
+        visit(fact)
+        return chain
+
+def format_chain(chain) -> List[str]:
+    lines = []
+    for k, (fact, derivation) in enumerate(chain, start=1):
+        if derivation is None:
+            lines.append(f"{k}. {fact} (asserted)")
+        else:
+            premises = ", ".join(str(p) for p in derivation.premises)
+            lines.append(f"{k}. {fact} by {derivation.rule} from {premises}")
+    return lines
+
+class SWRLReasoner:
+    """Ontology facts and SWRL rules run to a fixpoint once, then queried per question.
+
+    Class facts come from rdf:type assertions on individuals and property
+    facts from triples whose predicate is used in a rule. rdfs:subClassOf
+    and owl:equivalentClass axioms of the ontology index are applied as
+    rules too.
+    """
+
+    def __init__(self, graph, ontology, rules: List[Rule]):
+        compiled = [compile_rule(f"rule {rule.number}", rule.body, rule.head) for rule in rules]
+        for sub, sup in ontology.subclass_edges:
+            compiled.append(self._class_rule("rdfs:subClassOf", ontology, sub, sup))
+        for a, b in ontology.equivalent_pairs:
+            compiled.append(self._class_rule("owl:equivalentClass", ontology, a, b))
+            compiled.append(self._class_rule("owl:equivalentClass", ontology, b, a))
+
+        self.engine = ForwardChainer(compiled)
+        names = {atom.predicate for rule in compiled for atom in rule.atoms + rule.head}
+        values = {}
+
+        def value(term):
+            v = values.get(term)
+            if v is None:
+                v = values[term] = term_value(term)
+            return v
+
+        for s, p, o in graph:
+            if p == RDF.type:
+                if not str(o).startswith(VOCABULARY_NAMESPACES) and value(o) in names:
+                    self.engine.add(value(o), (value(s),))
+            elif not str(p).startswith(VOCABULARY_NAMESPACES) and value(p) in names:
+                self.engine.add(value(p), (value(s), value(o)))
+        self.inferred_count = self.engine.run()
+
+        self.predicates = {name.lower(): name for name in self.engine.facts}
+        self.predicates.update({atom.predicate.lower(): atom.predicate for rule in compiled for atom in rule.head})
+        self.individuals = {
+            str(value).lower(): value
+            for facts in self.engine.facts.values() for args in facts for value in args
+            if isinstance(value, str)
+        }
+        self._fact_tokens = [(fact, set(tokenize(str(fact)))) for fact in self.engine.inferred()]
+
+    @staticmethod
+    def _class_rule(label, ontology, sub, sup):
+        return compile_rule(
+            label,
+            [Atom(ontology.local_name(sub), ("?x",))],
+            [Atom(ontology.local_name(sup), ("?x",))],
+        )
+
+    def _resolve(self, predicate: str, args) -> Optional[Fact]:
+        name = self.predicates.get(predicate.lower())
+        if name is None:
+            return None
+        values = []
+        for arg in args:
+            value = arg if not isinstance(arg, str) else self.individuals.get(arg.lower())
+            if value is None:
+                return None
+            values.append(value)
+        return Fact(name, tuple(values))
+
+    def question_facts(self, question: str) -> List[Fact]:
+        """Facts a yes/no question asks about, e.g. "Is alice a Customer?" or "RewardEligible(alice)?"."""
+        atoms = [a for a in parse_atoms(question) if a.args and not any(is_variable(x) for x in a.args)]
+        if atoms:
+            facts = [self._resolve(a.name, [parse_constant(x) for x in a.args]) for a in atoms]
+            return facts if all(facts) else []
+        text = question.strip().rstrip("?").strip()
+        match = re.fullmatch(r"(?i)(?:is|are)\s+(\S+)\s+(?:an?\s+)?(\S+)", text)
+        if match:
+            fact = self._resolve(match.group(2), [match.group(1)])
+            return [fact] if fact else []
+        match = re.fullmatch(r"(?i)(?:does|do)\s+(\S+)\s+(\S+)\s+(\S+)", text)
+        if match:
+            fact = self._resolve(match.group(2), [match.group(1), parse_constant(match.group(3))])
+            return [fact] if fact else []
+        return []
+
+    def answer(self, question: str) -> Optional[str]:
+        """Answer an entailment question whose facts all hold, or return None to leave it to the model.
+
+        A fact that cannot be derived may still be true of individuals or
+        facts missing from the ontology, so it is never answered with "No".
+        """
+        facts = self.question_facts(question)
+        if not facts or not all(self.engine.holds(fact) for fact in facts):
+            return None
+        parts = []
+        for fact in facts:
+            lines = format_chain(self.engine.explain(fact))
+            parts.append(f"Yes. {fact} follows from the ontology and SWRL rules:\n" + "\n".join(lines))
+        return "\n\n".join(parts)
+
+    def relevant_inferences(self, question: str, limit: int = 20) -> str:
+        """Derivation chains of the inferred facts sharing the most words with the question."""
+        query = set(tokenize(question))
+        scored = [(len(query & tokens), str(fact), fact) for fact, tokens in self._fact_tokens if query & tokens]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        blocks = []
+        for _, text, fact in scored[:limit]:
+            blocks.append(f"{text}:\n" + "\n".join(f"  {line}" for line in format_chain(self.engine.explain(fact))))
+        return "\n".join(blocks)
@@ -0,0 +1,144 @@
+import re
+import hashlib
+from itertools import groupby, permutations, product
+from math import factorial
+from typing import Iterable, List, NamedTuple, Tuple
+
+_NUMBER = re.compile(r"^\s*(\d+)\s*[.)]\s*")
+_ARROW = re.compile(r"\s*(?:→|->|⇒|=>)\s*")
+_ATOM = re.compile(r"([A-Za-z_][\w:#\-]*)\s*\(([^()]*)\)")
+
+class Atom(NamedTuple):
+    predicate: str
+    args: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        """Predicate without a namespace prefix (ex:Customer -> Customer)."""
+        return re.split(r"[:#]", self.predicate)[-1]
+
+class Rule(NamedTuple):
+    number: int
+    text: str
+    body: Tuple[Atom, ...]
+    head: Tuple[Atom, ...]
+
+def parse_atoms(text: str) -> Tuple[Atom, ...]:
+    return tuple(
+        Atom(m.group(1), tuple(a.strip() for a in m.group(2).split(",") if a.strip()))
+        for m in _ATOM.finditer(text)
+    )
+
+def parse_rule(line: str, number: int = 0):
+    """Parse one rule line, or return None when it has no implication arrow."""
+    line = line.strip()
+    parts = _ARROW.split(line, maxsplit=1)
+    if len(parts) != 2:
+        return None
+    match = _NUMBER.match(parts[0])
+    if match:
+        number = int(match.group(1))
+    body = parts[0][match.end():] if match else parts[0]
+    return Rule(number, line, parse_atoms(body), parse_atoms(parts[1]))
+
+def parse_rules(text: str) -> List[Rule]:
+    """Parse numbered SWRL rules, one per line ("1. A(?x) ∧ B(?x) → C(?x)").
+
+    Lines without an implication arrow are skipped. Rules keep their number
+    from the file, or their position among the rules when unnumbered.
+    """
+    rules = []
+    for line in text.splitlines():
+        rule = parse_rule(line, len(rules) + 1)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+# --- Canonical form ---
+
+CANONICAL_VARIABLES = ("?x", "?y", "?z", "?w", "?u", "?v")
+
+def variable_name(k: int) -> str:
+    return CANONICAL_VARIABLES[k] if k < len(CANONICAL_VARIABLES) else f"?x{k}"
+
+def format_atom(atom: Atom) -> str:
+    return f"{atom.predicate}({', '.join(atom.args)})"
+
+# Above this many candidate orderings, canonical_rule settles for iterative sorting.
+MAX_CANONICAL_ORDERINGS = 5040
+
+def _shape(atom: Atom, names: dict):
+    return (atom.predicate, tuple(names.get(a, "?") if a.startswith("?") else a for a in atom.args))
+
+def _rename(body, head):
+    names = {}
+    for atom in list(body) + list(head):
+        for arg in atom.args:
+            if arg.startswith("?") and arg not in names:
+                names[arg] = variable_name(len(names))
+    return names
+
+def _render(body, head, names) -> str:
+    def render(atoms):
+        texts = dict.fromkeys(format_atom(Atom(a.predicate, tuple(names.get(x, x) for x in a.args))) for a in atoms)
+        return " ∧ ".join(texts)
+    return f"{render(body)} → {render(head)}"
+
+def _orderings(atoms):
+    """All orderings of atoms sorted by shape, permuting only atoms of equal shape."""
+    groups = [list(g) for _, g in groupby(sorted(atoms, key=lambda a: _shape(a, {})), key=lambda a: _shape(a, {}))]
+    for choice in product(*(permutations(g) for g in groups)):
+        yield [atom for group in choice for atom in group]
+
+def canonical_rule(rule: Rule) -> str:
+    """Return the rule with sorted, deduplicated atoms and variables renamed in order of use.
+
+    Rules that differ only in variable names or in the order of their atoms
+    get the same canonical text. Atoms are sorted by predicate and argument
+    pattern, and variables are renamed ?x, ?y, ... by first appearance;
+    among atoms of the same pattern the ordering giving the smallest text is
+    chosen. Very large rules fall back to re-sorting until the order is stable.
+    """
+    orderings = 1
+    for atoms in (rule.body, rule.head):
+        for _, group in groupby(sorted(_shape(a, {}) for a in atoms)):
+            orderings *= factorial(len(list(group)))
+
+    if orderings <= MAX_CANONICAL_ORDERINGS:
+        return min(
+            _render(body, head, _rename(body, head))
+            for body in _orderings(rule.body)
+            for head in _orderings(rule.head)
+        )
+
+    names = {}
+    for _ in range(len(rule.body) + len(rule.head) + 1):
+        body = sorted(rule.body, key=lambda a: _shape(a, names))
+        head = sorted(rule.head, key=lambda a: _shape(a, names))
+        renamed = _rename(body, head)
+        if renamed == names:
+            break
+        names = renamed
+    return _render(body, head, names)
+
+def rule_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_rules(lines: Iterable[str]) -> List[str]:
+    """Canonicalise rule lines (dropping their numbers) and remove duplicates by hash.
+
+    Lines that are not rules are kept as they are, once. The first
+    occurrence of each rule decides its position.
+    """
+    seen = set()
+    rules = []
+    for line in lines:
+        if not line.strip():
+            continue
+        rule = parse_rule(line)
+        text = canonical_rule(rule) if rule is not None and rule.body + rule.head else _NUMBER.sub("", line.strip())
+        digest = rule_hash(text)
+        if digest not in seen:
+            seen.add(digest)
+            rules.append(text)
+    return rules
@@ -0,0 +1,191 @@
+import random
+from pathlib import Path
+from typing import List
+
+# Words combined into class names, labels and document sentences.
+VOCABULARY = (
+    "account", "address", "agent", "approval", "asset", "audit", "batch", "booking", "budget", "catalog",
+    "channel", "claim", "contract", "customer", "delivery", "department", "device", "document", "employee",
+    "event", "facility", "invoice", "item", "ledger", "license", "location", "message", "order", "owner",
+    "partner", "payment", "permit", "policy", "price", "process", "product", "project", "quote", "receipt",
+    "record", "report", "request", "reservation", "resource", "review", "risk", "route", "schedule",
+    "service", "session", "shipment", "sensor", "supplier", "task", "team", "ticket", "transfer", "user",
+    "vehicle", "warehouse",
+)
+QUALIFIERS = (
+    "active", "annual", "approved", "archived", "central", "digital", "external", "internal", "local",
+    "pending", "primary", "public", "regional", "scheduled", "shared", "temporary",
+)
+VERBS = ("approves", "creates", "depends on", "manages", "produces", "references", "requires", "updates")
+
+def camel(words) -> str:
+    return "".join(word.capitalize() for word in words)
+
+def class_names(n: int, seed: int = 0) -> List[str]:
+    """Return n distinct class names such as "ApprovedInvoiceLedger"."""
+    rng = random.Random(seed)
+    names = {}
+    while len(names) < n:
+        words = rng.sample(VOCABULARY, rng.randint(1, 2))
+        if rng.random() < 0.5:
+            words.insert(0, rng.choice(QUALIFIERS))
+        name = camel(words)
+        # Numbered once the combinations run short, so any n is reachable.
+        names[name + str(len(names)) if name in names else name] = None
+    return list(names)
+
+def _label(name: str) -> str:
+    label = []
+    for ch in name:
+        if ch.isupper() and label:
+            label.append(" ")
+        label.append(ch.lower())
+    return "".join(label)
+
+def _near_duplicate(label: str, rng: random.Random) -> str:
+    """A variant of a label: a dropped letter, a plural or changed case."""
+    kind = rng.randrange(3)
+    if kind == 0 and len(label) > 4:
+        k = rng.randrange(1, len(label) - 1)
+        return label[:k] + label[k + 1:]
+    if kind == 1:
+        return label + "s"
+    return label.title()
+
+def synthetic_ontology(
+    path,
+    n_classes: int,
+    duplicate_rate: float = 0.05,
+    equivalent_rate: float = 0.01,
+    properties: int = None,
+    seed: int = 0,
+) -> dict:
+    """Write a Turtle ontology with n_classes labelled classes and return its statistics.
+
+    About duplicate_rate of the classes get a label that nearly repeats the
+    label of an earlier class, and equivalent_rate of them an explicit
+    owl:equivalentClass axiom. Classes form a random subclass forest, and
+    object properties (n_classes / 10 by default) get a domain and range.
+    """
+    rng = random.Random(seed)
+    names = class_names(n_classes, seed)
+    labels = []
+    stats = {"classes": n_classes, "near_duplicates": 0, "equivalent": 0, "properties": 0}
+    lines = [
+        "@prefix ex: <http://example.org/ontology#> .",
+        "@prefix owl: <http://www.w3.org/2002/07/owl#> .",
+        "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .",
+        "",
+    ]
+
+    for k, name in enumerate(names):
+        if k and rng.random() < duplicate_rate:
+            label = _near_duplicate(labels[rng.randrange(k)], rng)
+            stats["near_duplicates"] += 1
+        else:
+            label = _label(name)
+        labels.append(label)
+        lines.append(f'ex:{name} a owl:Class ;\n    rdfs:label "{label}"@en .')
+        if k and rng.random() < 0.7:
+            lines.append(f"ex:{name} rdfs:subClassOf ex:{names[rng.randrange(k)]} .")
+        if k and rng.random() < equivalent_rate:
+            lines.append(f"ex:{name} owl:equivalentClass ex:{names[rng.randrange(k)]} .")
+            stats["equivalent"] += 1
+
+    for k in range(n_classes // 10 if properties is None else properties):
+        verb = rng.choice(VERBS).split()
+        name = verb[0] + camel(verb[1:]) + names[rng.randrange(n_classes)] + str(k)
+        domain, range_ = rng.choice(names), rng.choice(names)
+        lines.append(f"ex:{name} a owl:ObjectProperty ;\n    rdfs:domain ex:{domain} ;\n    rdfs:range ex:{range_} .")
+        stats["properties"] += 1
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return stats
+
+def synthetic_rules(classes: List[str], n_rules: int, seed: int = 0) -> str:
+    """Return n_rules numbered SWRL rules chaining the given classes."""
+    rng = random.Random(seed)
+    rules = []
+    for k in range(1, n_rules + 1):
+        a, b, c = rng.sample(classes, 3)
+        rules.append(f"{k}. {a}(?x) ∧ relatedTo(?x, ?y) ∧ {b}(?y) → {c}(?x)")
+    return "\n".join(rules)
+
+def synthetic_extractions(n_graphs: int, concepts: int = 8, vocabulary: int = 2000, seed: int = 0) -> List[dict]:
+    """Return n_graphs meta-graphs in the JSON shape of an LLM extraction.
+
+    Concept ids are drawn from `vocabulary` class names in varying spellings
+    ("Invoice Ledger", "invoice_ledger", ...), as separate extractions name
+    the same concept.
+    """
+    rng = random.Random(seed)
+    names = class_names(vocabulary, seed)
+    spellings = (lambda n: n, lambda n: _label(n).title(), lambda n: _label(n).replace(" ", "_"))
+    graphs = []
+    for _ in range(n_graphs):
+        ids = [rng.choice(spellings)(name) for name in rng.sample(names, concepts)]
+        relationships = [
+            {"source": a, "target": b, "type": rng.choice(VERBS).upper().replace(" ", "_")}
+            for a, b in zip(ids, ids[1:])
+        ]
+        graphs.append({"concepts": [{"id": i} for i in ids], "relationships": relationships})
+    return graphs
+
+def synthetic_paragraph(rng: random.Random, sentences: int = 5) -> str:
+    parts = []
+    for _ in range(sentences):
+        a, b = rng.sample(VOCABULARY, 2)
+        parts.append(f"The {rng.choice(QUALIFIERS)} {a} {rng.choice(VERBS)} the {b}.")
+    return " ".join(parts)
+
+def synthetic_documents(
+    folder,
+    n_documents: int,
+    paragraphs: int = 20,
+    repeat_rate: float = 0.1,
+    formats=(".txt", ".md", ".docx"),
+    seed: int = 0,
+) -> List[Path]:
+    """Write n_documents documents into folder, cycling through `formats`.
+
+    Each document has a heading per five paragraphs; repeat_rate of the
+    paragraphs are copies of an earlier one, like boilerplate shared between
+    real documents. Returns the written paths.
+    """
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    written = []
+    previous = []
+
+    for k in range(n_documents):
+        blocks = []
+        for p in range(paragraphs):
+            if p % 5 == 0:
+                blocks.append(("heading", f"{k + 1}.{p // 5 + 1} {camel(rng.sample(VOCABULARY, 2))}"))
+            if previous and rng.random() < repeat_rate:
+                text = rng.choice(previous)
+            else:
+                text = synthetic_paragraph(rng)
+                previous.append(text)
+            blocks.append(("paragraph", text))
+
+        suffix = formats[k % len(formats)]
+        path = folder / f"document_{k + 1:05d}{suffix}"
+        if suffix == ".docx":
+            from docx import Document
+
+            doc = Document()
+            for kind, text in blocks:
+                if kind == "heading":
+                    doc.add_heading(text, level=2)
+                else:
+                    doc.add_paragraph(text)
+            doc.save(path)
+        else:
+            prefix = "## " if suffix == ".md" else ""
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(prefix + text if kind == "heading" else text for kind, text in blocks) + "\n")
+        written.append(path)
+    return written